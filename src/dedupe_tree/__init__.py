@@ -1,3 +1,3 @@
-"""Dedupe Tree - Find and remove duplicate files based on SHA256 checksums."""
+"""Dedupe Tree - Find and remove duplicate files based on BLAKE3 or SHA256 checksums."""
 
 __version__ = "0.1.0"
@@ -1,18 +1,91 @@
 """File checksum cache database."""
 
+import os
+import queue
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
 from pathlib import Path
 
+from .hashing import DEFAULT_HASH_ALGORITHM
+
+# Hot-path statements are kept as module constants so every call passes the
+# identical SQL string and hits sqlite3's prepared statement cache.
+_GET_SQL = """
+    SELECT file_cache.checksum FROM dirs
+    JOIN file_cache ON file_cache.dir_id = dirs.dir_id
+    WHERE dirs.dir_path = ? AND file_cache.name = ? AND file_cache.algorithm = ?
+        AND file_cache.file_size = ? AND file_cache.modification_time = ?
+"""
+
+_GET_MANY_SQL = """
+    SELECT probe.file_path, file_cache.checksum FROM probe
+    JOIN dirs ON dirs.dir_path = probe.dir_path
+    JOIN file_cache ON file_cache.dir_id = dirs.dir_id
+        AND file_cache.name = probe.name
+        AND file_cache.algorithm = ?
+        AND file_cache.file_size = probe.file_size
+        AND file_cache.modification_time = probe.modification_time
+"""
+
+# An upsert rather than INSERT OR REPLACE, so the checksum_refs triggers see
+# an UPDATE instead of a silent delete of the old row
+_PUT_SQL = """
+    INSERT INTO file_cache
+    (dir_id, name, algorithm, file_size, modification_time, checksum, last_access)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (dir_id, name, algorithm) DO UPDATE SET
+        file_size = excluded.file_size,
+        modification_time = excluded.modification_time,
+        checksum = excluded.checksum,
+        last_access = excluded.last_access
+"""
+
+_TOUCH_SQL = """
+    UPDATE file_cache SET last_access = ?
+    WHERE dir_id = (SELECT dir_id FROM dirs WHERE dir_path = ?) AND name = ? AND algorithm = ? AND last_access < ?
+"""
+
+# Eviction statements: stale rows are found through idx_last_access, and each
+# directory is checked for remaining files against file_cache's primary key
+_EVICT_SQL = "DELETE FROM file_cache WHERE last_access < ?"
+
+_PRUNE_DIRS_SQL = "DELETE FROM dirs WHERE dir_id NOT IN (SELECT dir_id FROM file_cache)"
+
+# Number of recent lookups answered from memory without touching SQLite
+_HOT_CACHE_SIZE = 200_000
+
+# Seconds the background writer lets rows accumulate before committing them
+_WRITER_FLUSH_INTERVAL = 0.25
+
+# Milliseconds a connection waits on a locked database before failing. Filesystems that
+# refuse WAL (some network mounts) leave the database in rollback-journal mode, where
+# readers and the writer take turns on the file lock instead of running side by side.
+_BUSY_TIMEOUT_MS = 5000
+
+# Rows sampled per index by ANALYZE, keeping statistics refreshes cheap on large caches
+_ANALYSIS_LIMIT = 1000
+
+# Seconds within which a row's last_access is recent enough to be left alone. Eviction works
+# in days, so a rescan of an unchanged tree reads its rows without rewriting them and idx_last_access.
+_TOUCH_INTERVAL = 24 * 60 * 60
+
+# Bump whenever the file_cache layout changes; older caches are rebuilt
+_SCHEMA_VERSION = 6
+
 
 class ChecksumCache:
     """SQLite-based cache for file checksums and metadata."""
 
-    def __init__(self, cache_path: Path | None = None) -> None:
+    def __init__(self, cache_path: Path | None = None, algorithm: str = DEFAULT_HASH_ALGORITHM) -> None:
         """
         Initialize cache database.
 
         Args:
             cache_path: Path to SQLite database file. If None, uses default location.
+            algorithm: Hash algorithm of the checksums read and written through this cache
         """
         if cache_path is None:
             # Use XDG cache directory or fallback to home
@@ -21,132 +94,581 @@ class ChecksumCache:
             cache_path = cache_dir / "checksums.db"
 
         self.cache_path = cache_path
+        # Checksums of different algorithms share the database but never answer for each other
+        self.algorithm = algorithm
+        # One writer connection guarded by a lock, plus one read-only connection per thread
         self._connection: sqlite3.Connection | None = None
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._readers: list[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        # Writes are queued without blocking and committed in batches by a background
+        # writer thread, so hashing threads never wait on SQLite
+        self._queue: queue.SimpleQueue[tuple[str, tuple[str, str, int, float, bytes]]] = queue.SimpleQueue()
+        self._pending: dict[str, tuple[str, str, int, float, bytes]] = {}
+        self._pending_threshold = 5000
+        self._flush_interval = _WRITER_FLUSH_INTERVAL
+        self._writer: threading.Thread | None = None
+        self._writer_wake = threading.Event()
+        self._writer_stop = threading.Event()
+        self._writer_error: BaseException | None = None
+        # Rows written inside an explicit begin()/commit_batch() transaction
+        self._batch_rows = 0
+        self._batch_size = 10000
+        # LRU of (path, size, mtime) -> checksum for recently seen entries
+        self._hot: OrderedDict[tuple[str, int, float], bytes] = OrderedDict()
+        self._hot_lock = threading.Lock()
+        # Paths looked up this session; their last_access is bumped on the next flush
+        self._session_time = time.time()
+        self._touched: set[str] = set()
+        # Interned directory ids known to the writer
+        self._dir_ids: dict[str, int] = {}
+        # Set when rows change, so close() refreshes the statistics behind get_cache_stats_fast()
+        self._stats_stale = False
+        # Open with blocks; nested ones share the connections and only the outermost closes them
+        self._users = 0
         self._init_database()
 
     def _init_database(self) -> None:
         """Initialize the database schema."""
-        conn = self._get_connection()
+        conn = self._writer_conn()
+
+        # The cache is disposable, so an outdated layout is simply rebuilt
+        if conn.execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+            outdated = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' LIMIT 1").fetchone() is not None
+            conn.execute("DROP TABLE IF EXISTS file_cache")
+            conn.execute("DROP TABLE IF EXISTS dirs")
+            conn.execute("DROP TABLE IF EXISTS checksum_refs")
+            conn.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
+            # Dropped tables leave their pages on the freelist; hand them back to the filesystem once
+            if outdated:
+                conn.execute("VACUUM")
+
+        # Directory paths are interned once so rows only carry an id and a file name.
+        # file_cache is WITHOUT ROWID, so its primary-key B-tree already holds every
+        # column and lookups need no separate covering index.
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS dirs (
+                dir_id INTEGER PRIMARY KEY,
+                dir_path TEXT NOT NULL UNIQUE
+            )
+        """
+        )
         conn.execute(
             """
             CREATE TABLE IF NOT EXISTS file_cache (
-                file_path TEXT PRIMARY KEY,
+                dir_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                algorithm TEXT NOT NULL,
                 file_size INTEGER NOT NULL,
                 modification_time REAL NOT NULL,
-                checksum TEXT NOT NULL
-            )
+                checksum BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (dir_id, name, algorithm)
+            ) WITHOUT ROWID
+        """
+        )
+
+        # Stale entries are evicted by when they were last used, not by file mtime
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_last_access
+            ON file_cache(last_access)
         """
         )
 
-        # Create index for faster lookups
+        # Reference counts per checksum, kept current by triggers, so the number of
+        # unique checksums is read without a COUNT(DISTINCT) sort over every row
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS checksum_refs (
+                checksum BLOB PRIMARY KEY,
+                refcount INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """
+        )
+        conn.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS checksum_refs_insert AFTER INSERT ON file_cache
+            BEGIN
+                INSERT INTO checksum_refs (checksum, refcount) VALUES (NEW.checksum, 1)
+                ON CONFLICT (checksum) DO UPDATE SET refcount = refcount + 1;
+            END
+        """
+        )
+        conn.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS checksum_refs_delete AFTER DELETE ON file_cache
+            BEGIN
+                UPDATE checksum_refs SET refcount = refcount - 1 WHERE checksum = OLD.checksum;
+                DELETE FROM checksum_refs WHERE checksum = OLD.checksum AND refcount <= 0;
+            END
+        """
+        )
         conn.execute(
             """
-            CREATE INDEX IF NOT EXISTS idx_modification_time
-            ON file_cache(modification_time)
+            CREATE TRIGGER IF NOT EXISTS checksum_refs_update AFTER UPDATE OF checksum ON file_cache
+            WHEN OLD.checksum IS NOT NEW.checksum
+            BEGIN
+                UPDATE checksum_refs SET refcount = refcount - 1 WHERE checksum = OLD.checksum;
+                DELETE FROM checksum_refs WHERE checksum = OLD.checksum AND refcount <= 0;
+                INSERT INTO checksum_refs (checksum, refcount) VALUES (NEW.checksum, 1)
+                ON CONFLICT (checksum) DO UPDATE SET refcount = refcount + 1;
+            END
         """
         )
         conn.commit()
 
-    def _get_connection(self) -> sqlite3.Connection:
-        """Get database connection, creating if needed."""
+    def _writer_conn(self) -> sqlite3.Connection:
+        """Get the single write connection, creating if needed."""
         if self._connection is None:
-            self._connection = sqlite3.connect(str(self.cache_path))
-            # Enable WAL mode for better performance
+            self._connection = sqlite3.connect(str(self.cache_path), cached_statements=256, isolation_level=None, check_same_thread=False)
+            # Enable WAL mode for better performance; readers never block the writer
             self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(f"PRAGMA busy_timeout={_BUSY_TIMEOUT_MS}")
+            # WAL only needs to sync on checkpoint; keep temp data and a 64 MB page cache in memory
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute("PRAGMA temp_store=MEMORY")
+            self._connection.execute("PRAGMA cache_size=-65536")
+            self._connection.execute("PRAGMA mmap_size=268435456")
+            self._connection.execute("PRAGMA wal_autocheckpoint=10000")
+            self._connection.execute(f"PRAGMA analysis_limit={_ANALYSIS_LIMIT}")
         return self._connection
 
-    def get_checksum(self, file_path: Path, file_size: int, modification_time: float) -> str | None:
+    def _reader_conn(self) -> sqlite3.Connection:
+        """Get the calling thread's read-only connection, creating if needed."""
+        conn: sqlite3.Connection | None = getattr(self._local, "conn", None)
+        if conn is None:
+            # Make sure the database and its WAL exist before opening read-only
+            self._writer_conn()
+            uri = f"{Path(self.cache_path).resolve().as_uri()}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, cached_statements=256, isolation_level=None, check_same_thread=False)
+            conn.execute(f"PRAGMA busy_timeout={_BUSY_TIMEOUT_MS}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA cache_size=-65536")
+            conn.execute("PRAGMA mmap_size=268435456")
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def get_checksum(self, file_path: str, file_size: int, modification_time: float) -> bytes | None:
         """
         Get cached checksum for a file if it's still valid.
 
         Args:
-            file_path: Path to the file
+            file_path: Path to the file as a string
             file_size: Current file size
             modification_time: Current file modification time
 
         Returns:
-            Cached checksum if valid, None otherwise
+            Cached raw checksum digest if valid, None otherwise
+        """
+        pending = self._pending.get(file_path)
+        if pending is not None:
+            return pending[4] if pending[2] == file_size and pending[3] == modification_time else None
+
+        key = (file_path, file_size, modification_time)
+        with self._hot_lock:
+            checksum = self._hot.get(key)
+            if checksum is not None:
+                self._hot.move_to_end(key)
+                self._touched.add(file_path)
+                return checksum
+
+        conn = self._reader_conn()
+        dir_path, name = os.path.split(file_path)
+        cursor = conn.execute(_GET_SQL, (dir_path, name, self.algorithm, file_size, modification_time))
+
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        stored: bytes = row[0]
+        self._remember(key, stored)
+        return stored
+
+    def get_checksum_many(self, rows: Iterable[tuple[str, int, float]]) -> dict[str, bytes]:
         """
-        conn = self._get_connection()
-        cursor = conn.execute(
+        Get cached checksums for many files with a single query.
+
+        Args:
+            rows: Iterable of (file_path, file_size, modification_time) tuples
+
+        Returns:
+            Dictionary mapping file path strings to valid cached raw checksum digests
+        """
+        probe = []
+        for path_str, size, mtime in rows:
+            probe.append((path_str, *os.path.split(path_str), size, mtime))
+        if not probe:
+            return {}
+
+        conn = self._reader_conn()
+        conn.execute(
+            """
+            CREATE TEMP TABLE IF NOT EXISTS probe (
+                file_path TEXT PRIMARY KEY,
+                dir_path TEXT NOT NULL,
+                name TEXT NOT NULL,
+                file_size INTEGER NOT NULL,
+                modification_time REAL NOT NULL
+            )
             """
-            SELECT checksum FROM file_cache
-            WHERE file_path = ? AND file_size = ? AND modification_time = ?
-            """,
-            (str(file_path), file_size, modification_time),
         )
+        conn.execute("DELETE FROM probe")
+        conn.executemany("INSERT OR REPLACE INTO probe VALUES (?, ?, ?, ?, ?)", probe)
+        found = dict(conn.execute(_GET_MANY_SQL, (self.algorithm,)).fetchall())
+        conn.execute("DELETE FROM probe")
 
-        row = cursor.fetchone()
-        return row[0] if row else None
+        # Rows still queued for the writer are only held in memory
+        with self._hot_lock:
+            for path_str, _, _, size, mtime in probe:
+                if path_str not in found:
+                    checksum = self._hot.get((path_str, size, mtime))
+                    if checksum is not None:
+                        found[path_str] = checksum
+
+        # Buffered writes are newer than anything on disk
+        for path_str, _, _, size, mtime in probe:
+            pending = self._pending.get(path_str)
+            if pending is None:
+                continue
+            if pending[2] == size and pending[3] == mtime:
+                found[path_str] = pending[4]
+            else:
+                found.pop(path_str, None)
 
-    def store_checksum(self, file_path: Path, file_size: int, modification_time: float, checksum: str) -> None:
+        for path_str, _, _, size, mtime in probe:
+            if path_str in found:
+                self._remember((path_str, size, mtime), found[path_str])
+
+        return found
+
+    def _remember(self, key: tuple[str, int, float], checksum: bytes, touch: bool = True) -> None:
+        """Record a checksum in the in-memory LRU, evicting the oldest entries."""
+        with self._hot_lock:
+            if touch:
+                self._touched.add(key[0])
+            self._hot[key] = checksum
+            self._hot.move_to_end(key)
+            while len(self._hot) > _HOT_CACHE_SIZE:
+                self._hot.popitem(last=False)
+
+    def store_checksum(self, file_path: str, file_size: int, modification_time: float, checksum: bytes) -> None:
         """
         Store checksum in cache.
 
+        The write is queued without blocking; a background thread commits queued
+        rows once the batch threshold or flush interval is reached, and
+        flush()/close() commit whatever is still queued.
+
         Args:
-            file_path: Path to the file
+            file_path: Path to the file as a string
             file_size: File size in bytes
             modification_time: File modification time
-            checksum: SHA256 checksum
+            checksum: Raw checksum digest
         """
-        conn = self._get_connection()
-        conn.execute(
-            """
-            INSERT OR REPLACE INTO file_cache
-            (file_path, file_size, modification_time, checksum)
-            VALUES (?, ?, ?, ?)
-            """,
-            (str(file_path), file_size, modification_time, checksum),
-        )
+        self._remember((file_path, file_size, modification_time), checksum, touch=False)
+        self._queue.put((file_path, (*os.path.split(file_path), file_size, modification_time, checksum)))
+        if self._writer is None:
+            self._start_writer()
+        elif self._queue.qsize() >= self._pending_threshold:
+            self._writer_wake.set()
+
+    def _start_writer(self) -> None:
+        """Start the background writer thread if it is not running yet."""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer_stop.clear()
+                self._writer = threading.Thread(target=self._writer_loop, name="dedupe-tree-cache-writer", daemon=True)
+                self._writer.start()
+
+    def _stop_writer(self) -> None:
+        """Stop the background writer thread, leaving queued rows for flush()."""
+        writer = self._writer
+        if writer is None:
+            return
+        self._writer_stop.set()
+        self._writer_wake.set()
+        writer.join()
+        self._writer = None
+
+    def _writer_loop(self) -> None:
+        """Commit queued rows every ``_flush_interval`` seconds or once ``_pending_threshold`` rows are queued."""
+        while not self._writer_stop.is_set():
+            self._writer_wake.wait(self._flush_interval)
+            self._writer_wake.clear()
+            # Rows only leave the queue under the write lock, so flush() never misses one in flight
+            with self._write_lock:
+                self._drain_queue()
+                if not self._pending:
+                    continue
+                try:
+                    self._flush_locked()
+                except Exception as e:
+                    # Surface the failure to the next caller of flush()
+                    self._writer_error = e
+
+    def _drain_queue(self) -> None:
+        """Move queued rows into the pending buffer; caller holds the write lock."""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._pending[item[0]] = item[1]
+
+    def store_checksums_bulk(self, rows: Iterable[tuple[str, int, float, bytes]]) -> None:
+        """
+        Store many checksums in a single transaction.
+
+        Rows still queued by store_checksum() are committed in the same transaction.
+
+        Args:
+            rows: Iterable of (file_path, file_size, modification_time, checksum) tuples
+        """
+        batch: dict[str, tuple[str, str, int, float, bytes]] = {}
+        for path_str, size, mtime, checksum in rows:
+            batch[path_str] = (*os.path.split(path_str), size, mtime, checksum)
+            self._remember((path_str, size, mtime), checksum, touch=False)
+        with self._write_lock:
+            # Queued rows are drained first, so a bulk row replaces an older queued one for the same path
+            self._drain_queue()
+            self._pending.update(batch)
+            self.flush()
+
+    def flush(self) -> None:
+        """Commit all queued checksum writes and access-time updates in one transaction."""
+        with self._write_lock:
+            self._drain_queue()
+            if self._writer_error is not None:
+                error, self._writer_error = self._writer_error, None
+                raise error
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        """Write pending rows and touched paths; caller holds the write lock."""
+        with self._hot_lock:
+            touched = [path for path in self._touched if path not in self._pending]
+            self._touched.clear()
+        if not self._pending and not touched:
+            return
+        rows = list(self._pending.values())
+        self._pending.clear()
+        self._write_rows(rows, touched)
+
+    def begin(self) -> None:
+        """
+        Open an explicit write transaction spanning many flushes.
+
+        Rows written until commit_batch() share one transaction, committed
+        every ``_batch_size`` rows so the WAL does not grow without bound.
+        """
+        with self._write_lock:
+            self.flush()
+            conn = self._writer_conn()
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+                self._batch_rows = 0
+
+    def commit_batch(self) -> None:
+        """Flush pending writes and commit the transaction opened by begin()."""
+        with self._write_lock:
+            self.flush()
+            conn = self._writer_conn()
+            if conn.in_transaction:
+                conn.execute("COMMIT")
+            self._batch_rows = 0
+
+    def _intern_dirs(self, conn: sqlite3.Connection, dir_paths: Iterable[str]) -> None:
+        """Make sure every directory path has a dir_id; caller holds the write lock."""
+        missing = {d for d in dir_paths if d not in self._dir_ids}
+        if not missing:
+            return
+        conn.executemany("INSERT OR IGNORE INTO dirs (dir_path) VALUES (?)", ((d,) for d in missing))
+        for dir_path in missing:
+            self._dir_ids[dir_path] = conn.execute("SELECT dir_id FROM dirs WHERE dir_path = ?", (dir_path,)).fetchone()[0]
+
+    def _insert_rows(self, conn: sqlite3.Connection, rows: list[tuple[str, str, int, float, bytes]], touched: list[str]) -> None:
+        """Insert rows and bump access times inside the current transaction."""
+        now = self._session_time
+        self._intern_dirs(conn, (row[0] for row in rows))
+        dir_ids = self._dir_ids
+        algorithm = self.algorithm
+        conn.executemany(_PUT_SQL, ((dir_ids[d], name, algorithm, size, mtime, checksum, now) for d, name, size, mtime, checksum in rows))
+        touch_before = now - _TOUCH_INTERVAL
+        conn.executemany(_TOUCH_SQL, ((now, *os.path.split(path), algorithm, touch_before) for path in touched))
+        if rows:
+            self._stats_stale = True
+
+    def _write_rows(self, rows: list[tuple[str, str, int, float, bytes]], touched: list[str] | None = None) -> None:
+        """Write rows with a single BEGIN IMMEDIATE/COMMIT pair; caller holds the write lock."""
+        touched = touched or []
+        if not rows and not touched:
+            return
+        conn = self._writer_conn()
+        if conn.in_transaction:
+            # Inside begin(): defer the commit to commit_batch() or the batch size
+            self._insert_rows(conn, rows, touched)
+            self._batch_rows += len(rows)
+            if self._batch_rows >= self._batch_size:
+                conn.execute("COMMIT")
+                conn.execute("BEGIN IMMEDIATE")
+                self._batch_rows = 0
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._insert_rows(conn, rows, touched)
+        except BaseException:
+            conn.rollback()
+            # Ids interned by the rolled back transaction no longer exist
+            self._dir_ids.clear()
+            raise
         conn.commit()
 
     def cleanup_stale_entries(self, max_age_days: int = 30) -> int:
         """
-        Remove cache entries older than max_age_days.
+        Remove cache entries not used by any scan within max_age_days, plus one day of slack.
+
+        A lookup records its use at most once per _TOUCH_INTERVAL (one day), so an entry's
+        recorded last use may lag its latest one by up to a day; entries are kept that much
+        longer rather than evicted while still in use.
 
         Args:
-            max_age_days: Maximum age in days for cache entries
+            max_age_days: Maximum age in days for cache entries, extended by the one day of slack.
+                0 removes every entry, with no slack.
 
         Returns:
             Number of entries removed
         """
-        import time
-
         cutoff_time = time.time() - (max_age_days * 24 * 60 * 60)
+        if max_age_days > 0:
+            cutoff_time -= _TOUCH_INTERVAL
 
-        conn = self._get_connection()
-        cursor = conn.execute("DELETE FROM file_cache WHERE modification_time < ?", (cutoff_time,))
-        conn.commit()
-        return cursor.rowcount
+        with self._write_lock:
+            self.flush()
+            conn = self._writer_conn()
+            cursor = conn.execute(_EVICT_SQL, (cutoff_time,))
+            conn.execute(_PRUNE_DIRS_SQL)
+            conn.commit()
+            if cursor.rowcount:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._dir_ids.clear()
+            self._stats_stale = True
+            with self._hot_lock:
+                self._hot.clear()
+            return cursor.rowcount
 
     def get_cache_stats(self) -> dict[str, int]:
         """Get cache statistics."""
-        conn = self._get_connection()
+        with self._write_lock:
+            self.flush()
+            conn = self._writer_conn()
 
-        cursor = conn.execute("SELECT COUNT(*) FROM file_cache")
-        total_entries = cursor.fetchone()[0]
+            cursor = conn.execute("SELECT COUNT(*) FROM file_cache")
+            total_entries = cursor.fetchone()[0]
 
-        cursor = conn.execute("SELECT COUNT(DISTINCT checksum) FROM file_cache")
-        unique_checksums = cursor.fetchone()[0]
+            cursor = conn.execute("SELECT COUNT(*) FROM checksum_refs")
+            unique_checksums = cursor.fetchone()[0]
 
         return {"total_entries": total_entries, "unique_checksums": unique_checksums}
 
+    def get_cache_stats_fast(self, exact: bool = False) -> dict[str, int]:
+        """
+        Get approximate cache statistics from sqlite_stat1 without counting rows.
+
+        The counts reflect the last ANALYZE, which close() refreshes whenever the
+        cache changed; they are gathered on first use if no statistics exist yet.
+
+        Args:
+            exact: Count rows like get_cache_stats() instead of reading statistics
+
+        Returns:
+            Dictionary with total_entries and unique_checksums
+        """
+        if exact:
+            return self.get_cache_stats()
+
+        with self._write_lock:
+            self.flush()
+            conn = self._writer_conn()
+            counts = self._stat_counts(conn)
+            if counts is None:
+                self._analyze(conn)
+                counts = self._stat_counts(conn) or (0, 0)
+
+        return {"total_entries": counts[0], "unique_checksums": counts[1]}
+
+    def _stat_counts(self, conn: sqlite3.Connection) -> tuple[int, int] | None:
+        """Read row count estimates from sqlite_stat1, or None if ANALYZE has not run."""
+        try:
+            rows = dict(conn.execute("SELECT tbl, stat FROM sqlite_stat1 WHERE tbl IN ('file_cache', 'checksum_refs')").fetchall())
+        except sqlite3.OperationalError:
+            # sqlite_stat1 only exists once ANALYZE has run
+            return None
+        if not rows:
+            return None
+        # The first number of each stat is the table's row count; empty tables have no row
+        total_entries = int(rows["file_cache"].split()[0]) if "file_cache" in rows else 0
+        unique_checksums = int(rows["checksum_refs"].split()[0]) if "checksum_refs" in rows else 0
+        return total_entries, unique_checksums
+
+    def _analyze(self, conn: sqlite3.Connection) -> None:
+        """Refresh sqlite_stat1 from a sample bounded by analysis_limit; caller holds the write lock."""
+        conn.execute("ANALYZE file_cache")
+        conn.execute("ANALYZE checksum_refs")
+        self._stats_stale = False
+
     def clear_cache(self) -> None:
         """Clear all cache entries."""
-        conn = self._get_connection()
-        conn.execute("DELETE FROM file_cache")
-        conn.commit()
+        with self._write_lock:
+            self._drain_queue()
+            self._pending.clear()
+            with self._hot_lock:
+                self._hot.clear()
+                self._touched.clear()
+            conn = self._writer_conn()
+            if conn.in_transaction:
+                conn.execute("COMMIT")
+            # The checksum_refs triggers rule out SQLite's truncate optimization, so a
+            # full wipe drops and recreates the tables instead of deleting row by row
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DROP TABLE IF EXISTS file_cache")
+            conn.execute("DROP TABLE IF EXISTS dirs")
+            conn.execute("DROP TABLE IF EXISTS checksum_refs")
+            conn.execute("COMMIT")
+            self._init_database()
+            self._dir_ids.clear()
+            self._batch_rows = 0
+            # Hand the freed WAL space back to the filesystem
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
 
     def close(self) -> None:
-        """Close database connection."""
-        if self._connection:
-            self._connection.close()
-            self._connection = None
+        """Flush pending writes and close all database connections."""
+        self._stop_writer()
+        self.commit_batch()
+        with self._readers_lock:
+            for reader in self._readers:
+                reader.close()
+            self._readers.clear()
+            # Other threads drop their stale handles on next use
+            self._local = threading.local()
+        with self._write_lock:
+            if self._connection:
+                if self._stats_stale:
+                    self._analyze(self._connection)
+                self._connection.close()
+                self._connection = None
 
     def __enter__(self) -> "ChecksumCache":
-        """Context manager entry."""
+        """Context manager entry; nested with blocks share the open cache."""
+        self._users += 1
         return self
 
     def __exit__(self, exc_type: type[BaseException] | None, exc_val: BaseException | None, exc_tb: object) -> None:
-        """Context manager exit."""
-        self.close()
+        """Context manager exit; the cache is closed when the outermost with block ends."""
+        self._users -= 1
+        if self._users == 0:
+            self.close()
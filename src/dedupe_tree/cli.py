@@ -1,185 +1,249 @@
 """Command-line interface for dedupe-tree."""
 
 import time
-from collections.abc import Callable
+from collections.abc import Callable, Iterator
+from itertools import batched, islice
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 import click
-from rich.console import Console
+from rich.console import Console, Group
 from rich.panel import Panel
-from rich.progress import Progress, SpinnerColumn, TextColumn
-from rich.table import Table
 
+from .cache import ChecksumCache
 from .deduplicator import DeduplicationResult, Deduplicator, format_size
-from .directory_scanner import DirectoryScanner
-from .scanner import FileScanner
+from .directory_scanner import DirectoryInfo, DirectoryScanner
+from .hashing import DEFAULT_HASH_ALGORITHM, HASH_ALGORITHMS, is_available
+from .scanner import FileInfo, FileScanner
+
+if TYPE_CHECKING:
+    from rich.table import Table
 
 console = Console()
 
+# Duplicate-group tables rendered per print call in the detailed report
+REPORT_BATCH_SIZE = 100
+
+# Columns the --log-file output is rendered at, whatever the terminal's width
+LOG_WIDTH = 120
+
 
 @click.command()
 @click.argument("directory", type=click.Path(exists=True, file_okay=False, path_type=Path))
 @click.option("--delete", is_flag=True, help="Replace duplicate files/directories with symbolic links (default is dry-run with report)")
 @click.option("--directories", is_flag=True, help="Only process directory trees (default processes files only)")
+@click.option("--both", is_flag=True, help="Process files and directory trees together in a single walk")
+@click.option(
+    "--hardlinks",
+    is_flag=True,
+    help="With --delete, replace duplicate files with hard links instead of symbolic links (directories always get symbolic links)",
+)
 @click.option("--extensions", help="Comma-separated list of file extensions to include (e.g., '.txt,.py,.md')")
 @click.option("--min-size", type=int, default=0, help="Minimum file size in bytes to consider (default: 0)")
 @click.option("--min-files", type=int, default=2, help="Minimum files in directory to consider for directory deduplication (default: 2)")
 @click.option("--min-dir-size", type=int, default=0, help="Minimum directory size in bytes to consider for directory deduplication (default: 0)")
+@click.option(
+    "--hash",
+    "hash_algorithm",
+    type=click.Choice(HASH_ALGORITHMS),
+    default=DEFAULT_HASH_ALGORITHM,
+    show_default=True,
+    help="Checksum algorithm for file contents (blake3 requires the 'fast' extra)",
+)
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of files hashed concurrently (default: CPU count + 4, at most 32)",
+)
+@click.option(
+    "--max-groups",
+    type=click.IntRange(min=0),
+    default=None,
+    help="Show at most this many file groups, and as many directory groups, in the detailed report (default: all)",
+)
 @click.option("--log-file", type=click.Path(path_type=Path), help="Write output to a log file")
 def main(
     directory: Path,
     delete: bool,
     directories: bool,
+    both: bool,
+    hardlinks: bool,
     extensions: str | None,
     min_size: int,
     min_files: int,
     min_dir_size: int,
+    hash_algorithm: str,
+    jobs: int | None,
+    max_groups: int | None,
     log_file: Path | None,
 ) -> None:
     """
     Find duplicate files or directory trees, replacing duplicates with symbolic links.
 
-    By default, processes individual files only. Use --directories to process directory trees instead.
+    By default, processes individual files only. Use --directories to process directory trees instead,
+    or --both to process files and directory trees from one walk of the tree.
     By default, runs in dry-run mode with comprehensive reporting.
-    Use --delete to replace duplicates with symbolic links to the kept versions.
+    Use --delete to replace duplicates with symbolic links to the kept versions, or
+    add --hardlinks to replace duplicate files with hard links instead.
+    Use --max-groups to shorten the detailed report on trees with many duplicates.
 
     Strategy: Keeps files/directories with the shallowest nesting depth, links duplicates to them.
     """
-    start_time = time.time()
+    options = (directory, delete, directories, both, hardlinks, extensions, min_size, min_files, min_dir_size, hash_algorithm, jobs, max_groups)
+    if not log_file:
+        _run(*options, console.print)
+        return
 
-    # Set up console for potential log file output
-    if log_file:
-        log_console = Console(file=open(log_file, "w"), width=120)
+    # Report output is rendered once, at the log's fixed width, on a console that records it for
+    # the log file; progress spinners stay on the terminal console, so they are never recorded
+    report_console = Console(record=True, width=LOG_WIDTH)
+    try:
+        _run(*options, report_console.print)
+    finally:
+        log_file.write_text(report_console.export_text(clear=True), encoding="utf-8")
 
-        # Use a custom function to write to both console and log
-        def dual_print(content: object, **kwargs: object) -> None:
-            console.print(content, **kwargs)  # type: ignore[arg-type]
-            log_console.print(content, **kwargs)  # type: ignore[arg-type]
 
-        print_func = dual_print
-    else:
-        print_func = console.print  # type: ignore[assignment]
+def _run(
+    directory: Path,
+    delete: bool,
+    directories: bool,
+    both: bool,
+    hardlinks: bool,
+    extensions: str | None,
+    min_size: int,
+    min_files: int,
+    min_dir_size: int,
+    hash_algorithm: str,
+    jobs: int | None,
+    max_groups: int | None,
+    print_func: Callable[..., Any],
+) -> None:
+    """Scan, report and optionally link duplicates for main(), printing through print_func."""
+    # Imported here rather than at module load, so --help and argument errors skip the cost
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+
+    start_time = time.time()
 
-    # Parse extensions filter
-    ext_filter: set[str] | None = None
+    # Parse extensions filter into a lowercase set, deduplicating repeated extensions before they are matched with str.endswith
+    ext_filter: frozenset[str] | None = None
     if extensions:
-        ext_filter = {ext.strip().lower() for ext in extensions.split(",")}
-        if not all(ext.startswith(".") for ext in ext_filter):
-            print_func("[red]Error: Extensions must start with a dot (e.g., '.txt')[/red]")
+        ext_filter = frozenset(ext for ext in (e.strip().lower() for e in extensions.split(",")) if ext)
+        invalid = [ext for ext in ext_filter if not ext.startswith(".")]
+        if invalid:
+            print_func(f"[red]Error: Extensions must start with a dot (e.g., '.txt'): {', '.join(sorted(invalid))}[/red]")
             raise click.Abort()
 
-    # Display mode
+    if not is_available(hash_algorithm):
+        print_func(f"[red]Error: {hash_algorithm} is not installed (pip install 'dedupe-tree[fast]')[/red]")
+        raise click.Abort()
+
+    # Display mode; --both covers files and directory trees with a single walk
+    scan_directories = directories or both
+    scan_files = not directories or both
     mode = "DELETE" if delete else "DRY RUN"
     mode_color = "red" if delete else "yellow"
-    scan_type = "Directory Trees Only" if directories else "Files Only"
-
-    if directories:
-        info_text = (
-            f"[bold]{mode} MODE - {scan_type}[/bold]\n"
-            f"Directory: {directory}\n"
-            f"Min files per directory: {min_files}\n"
-            f"Min directory size: {format_size(min_dir_size)}"
-        )
+    if both:
+        scan_type = "Files and Directory Trees"
     else:
-        info_text = (
-            f"[bold]{mode} MODE - {scan_type}[/bold]\n"
-            f"Directory: {directory}\n"
-            f"Extensions: {extensions or 'All files'}\n"
-            f"Min file size: {format_size(min_size)}"
-        )
+        scan_type = "Directory Trees Only" if directories else "Files Only"
+
+    info_lines = [f"[bold]{mode} MODE - {scan_type}[/bold]", f"Directory: {directory}"]
+    if scan_directories:
+        info_lines += [f"Min files per directory: {min_files}", f"Min directory size: {format_size(min_dir_size)}"]
+    if scan_files:
+        info_lines += [f"Extensions: {extensions or 'All files'}", f"Min file size: {format_size(min_size)}"]
+    info_lines.append(f"Hash: {hash_algorithm}")
 
     print_func(
         Panel(
-            info_text,
+            "\n".join(info_lines),
             title=f"[{mode_color}]Dedupe Tree[/{mode_color}]",
             border_style=mode_color,
         )
     )
 
-    if directories:
-        # Directory-only mode
-        dir_scanner = DirectoryScanner()
-
-        with Progress(SpinnerColumn(), TextColumn("[progress.description]{task.description}"), console=console) as progress:
+    scanner: FileScanner | None = None
+    dir_scanner: DirectoryScanner | None = None
+    duplicate_groups: dict[str, list[FileInfo]] = {}
+    duplicate_directories: dict[str, list[DirectoryInfo]] = {}
+
+    # One cache connection and one live display are shared by every phase
+    with (
+        ChecksumCache(algorithm=hash_algorithm) as cache,
+        Progress(SpinnerColumn(), TextColumn("[progress.description]{task.description}"), console=console) as progress,
+    ):
+        if scan_files:
+            scanner = FileScanner(cache=cache, max_workers=jobs)
+
+        if scan_directories:
+            dir_scanner = DirectoryScanner(cache=cache, max_workers=jobs)
+            # With --both, the directory walk also records files for the file scanner; the checksums
+            # it computes land in the shared cache, so finding file duplicates reads nothing again
             scan_task = progress.add_task("Scanning directory trees...", total=None)
-            dir_scanner.scan_directory_tree(directory, min_files)
+            dir_scanner.scan_directory_tree(directory, min_files, min_dir_size, scanner, ext_filter, min_size)
             progress.update(scan_task, description=f"Found {len(dir_scanner.scanned_directories)} directories")
-
-        if not dir_scanner.scanned_directories:
-            print_func("[yellow]No directories found to process.[/yellow]")
-            return
-
-        # Filter directories by minimum size
-        if min_dir_size > 0:
-            original_count = len(dir_scanner.scanned_directories)
-            dir_scanner.scanned_directories = [d for d in dir_scanner.scanned_directories if d.size >= min_dir_size]
-            filtered_count = original_count - len(dir_scanner.scanned_directories)
-            if filtered_count > 0:
-                print_func(f"[dim]Filtered out {filtered_count} directories smaller than {format_size(min_dir_size)}[/dim]")
-
-        if not dir_scanner.scanned_directories:
-            print_func("[yellow]No directories found after filtering.[/yellow]")
-            return
-
-        # Find duplicate directories
-        with Progress(SpinnerColumn(), TextColumn("[progress.description]{task.description}"), console=console) as progress:
-            dup_task = progress.add_task("Finding directory duplicates...", total=None)
-            duplicate_directories = dir_scanner.get_duplicate_directories()
-            progress.update(dup_task, description="Analyzing directory duplicates...")
-
-        if not duplicate_directories:
-            print_func("[green]✓ No duplicate directories found![/green]")
-            return
-
-        # Analyze what to remove
-        deduplicator = Deduplicator()
-        result = deduplicator.analyze_duplicates({}, duplicate_directories)
-
-    else:
-        # File-only mode (default)
-        scanner = FileScanner()
-
-        # Scan files
-        with Progress(SpinnerColumn(), TextColumn("[progress.description]{task.description}"), console=console) as progress:
-            scan_task = progress.add_task("Scanning files...", total=None)
-            scanner.scan_directory(directory, ext_filter)
-            progress.update(scan_task, description=f"Found {len(scanner.scanned_files)} files")
-
-        # Filter files by minimum size
-        if min_size > 0:
-            original_count = len(scanner.scanned_files)
-            scanner.scanned_files = [f for f in scanner.scanned_files if f.size >= min_size]
-            filtered_count = original_count - len(scanner.scanned_files)
-            if filtered_count > 0:
-                print_func(f"[dim]Filtered out {filtered_count} files smaller than {format_size(min_size)}[/dim]")
-
-        if not scanner.scanned_files:
-            print_func("[yellow]No files found to process.[/yellow]")
-            return
-
-        # Find duplicate files
-        with Progress(SpinnerColumn(), TextColumn("[progress.description]{task.description}"), console=console) as progress:
-            dup_task = progress.add_task("Finding file duplicates...", total=None)
-            duplicate_groups = scanner.get_duplicates()
-            progress.update(dup_task, description="Analyzing file duplicates...")
-
-        if not duplicate_groups:
-            print_func("[green]✓ No duplicate files found![/green]")
-            return
-
-        # Analyze what to remove
-        deduplicator = Deduplicator()
-        result = deduplicator.analyze_duplicates(duplicate_groups, {})
+            progress.stop_task(scan_task)
+
+            if not dir_scanner.scanned_directories and not dir_scanner.skipped_small:
+                print_func("[yellow]No directories found to process.[/yellow]")
+            else:
+                # Directories below the minimum size were skipped during the scan
+                if dir_scanner.skipped_small > 0:
+                    print_func(f"[dim]Filtered out {dir_scanner.skipped_small} directories smaller than {format_size(min_dir_size)}[/dim]")
+
+                if not dir_scanner.scanned_directories:
+                    print_func("[yellow]No directories found after filtering.[/yellow]")
+
+            if dir_scanner.scanned_directories:
+                # Find duplicate directories
+                dup_task = progress.add_task("Finding directory duplicates...", total=None)
+                duplicate_directories = dir_scanner.get_duplicate_directories()
+                progress.update(dup_task, description="Analyzing directory duplicates...")
+                progress.stop_task(dup_task)
+            elif not scan_files:
+                return
+
+        if scanner is not None:
+            if not both:
+                # Scan files
+                scan_task = progress.add_task("Scanning files...", total=None)
+                scanner.scan_directory(directory, ext_filter, min_size)
+                progress.update(scan_task, description=f"Found {len(scanner.scanned_files)} files")
+                progress.stop_task(scan_task)
+
+            # Files below the minimum size were skipped during the scan
+            if scanner.skipped_small > 0:
+                print_func(f"[dim]Filtered out {scanner.skipped_small} files smaller than {format_size(min_size)}[/dim]")
+
+            if not scanner.scanned_files:
+                print_func("[yellow]No files found to process.[/yellow]")
+                if not duplicate_directories:
+                    return
+            else:
+                # Find duplicate files
+                dup_task = progress.add_task("Finding file duplicates...", total=None)
+                duplicate_groups = scanner.get_duplicates()
+                progress.update(dup_task, description="Analyzing file duplicates...")
+                progress.stop_task(dup_task)
+
+    if scan_directories and not duplicate_directories:
+        print_func("[green]✓ No duplicate directories found![/green]")
+    if scan_files and not duplicate_groups:
+        print_func("[green]✓ No duplicate files found![/green]")
+    if not duplicate_groups and not duplicate_directories:
+        return
+
+    # Analyze what to remove
+    deduplicator = Deduplicator()
+    result = deduplicator.analyze_duplicates(duplicate_groups, duplicate_directories)
 
     # Display summary
     print_func("\n[bold]Summary:[/bold]")
-    if directories:
-        # Directory mode - only show directory stats
+    if scan_directories:
         print_func(f"• Total duplicate directory groups: {len(result.directory_groups)}")
         print_func(f"• Directories to remove: {result.total_directories_to_remove}")
-    else:
-        # File mode - only show file stats
+    if scan_files:
         print_func(f"• Total duplicate file groups: {len(result.groups)}")
         print_func(f"• Files to remove: {result.total_files_to_remove}")
     print_func(f"• Space to free: [green]{format_size(result.total_space_to_free)}[/green]")
@@ -188,7 +252,7 @@ def main(
         print_func(f"• Errors encountered: [red]{len(result.errors)}[/red]")
 
     # Show detailed report (always enabled)
-    show_detailed_report(result, print_func)
+    show_detailed_report(result, print_func, max_groups)
 
     # Show errors if any
     if result.errors:
@@ -198,55 +262,77 @@ def main(
 
     # Delete files/directories or show dry run summary
     if delete:
-        if directories:
-            total_items = result.total_directories_to_remove
-            item_type = "directories"
+        total_items = result.total_files_to_remove + result.total_directories_to_remove
+        if both:
+            item_type = "files and directories"
         else:
-            total_items = result.total_files_to_remove
-            item_type = "files"
+            item_type = "directories" if directories else "files"
 
         if total_items == 0:
             print_func("[yellow]Nothing to link.[/yellow]")
             return
 
-        if not click.confirm(f"\nReally replace {total_items} {item_type} with symbolic links?"):
+        # Only files can be hard linked; directories are always replaced with symbolic links
+        file_links = "hard links" if hardlinks else "symbolic links"
+        if not scan_files:
+            link_type = "symbolic links"
+        else:
+            link_type = "hard and symbolic links" if hardlinks and scan_directories else file_links
+
+        if not click.confirm(f"\nReally replace {total_items} {item_type} with {link_type}?"):
             print_func("[yellow]Aborted.[/yellow]")
             return
 
-        linked_files, linked_directories = deduplicator.execute_removal(result, dry_run=False)
+        linked_files, linked_directories = deduplicator.execute_removal(result, dry_run=False, max_workers=jobs, use_symlinks=not hardlinks)
 
-        if directories:
+        if scan_directories:
             print_func(f"\n[green]✓ Replaced {len(linked_directories)} duplicate directories with symbolic links[/green]")
-        else:
-            print_func(f"\n[green]✓ Replaced {len(linked_files)} duplicate files with symbolic links[/green]")
+        if scan_files:
+            print_func(f"\n[green]✓ Replaced {len(linked_files)} duplicate files with {file_links}[/green]")
 
         if deduplicator.errors:
-            print_func(f"[red]Failed to create symbolic links for {len(deduplicator.errors)} items[/red]")
+            print_func(f"[red]Failed to create {link_type} for {len(deduplicator.errors)} items[/red]")
             for path, error in deduplicator.errors:
                 print_func(f"  {path}: {error}")
     else:
         # Comprehensive dry-run summary
-        if directories:
-            show_dry_run_summary(result, None, dir_scanner, print_func)
-        else:
-            show_dry_run_summary(result, scanner, None, print_func)
+        show_dry_run_summary(result, scanner, dir_scanner, print_func)
 
     # Calculate and display total time
     end_time = time.time()
     total_time = end_time - start_time
     print_func(f"\n[dim]Total time: {total_time:.2f} seconds[/dim]")
 
-    # Close log file if opened
-    if log_file:
-        log_console.file.close()
 
+def show_detailed_report(result: DeduplicationResult, print_func: Callable[..., Any] = console.print, max_groups: int | None = None) -> None:
+    """
+    Show detailed report of duplicate groups.
 
-def show_detailed_report(result: DeduplicationResult, print_func: Callable[..., Any] = console.print) -> None:
-    """Show detailed report of all duplicate groups."""
+    Args:
+        result: Analysis whose groups are already sorted by space saved
+        print_func: Function used to print each batch of tables
+        max_groups: Largest number of file groups, and of directory groups, to show; None shows all
+    """
     print_func("\n[bold]Detailed Report:[/bold]")
 
+    # Tables are built lazily and printed a batch at a time: each batch enters the renderer once,
+    # and only REPORT_BATCH_SIZE tables are alive at any point however many groups there are
+    for batch in batched(_iter_report_tables(result, max_groups), REPORT_BATCH_SIZE):
+        print_func(Group(*(part for table in batch for part in (table, ""))))
+
+    if max_groups is not None:
+        omitted_files = max(len(result.groups) - max_groups, 0)
+        omitted_directories = max(len(result.directory_groups) - max_groups, 0)
+        if omitted_files or omitted_directories:
+            print_func(f"[dim]{omitted_files} more file groups and {omitted_directories} more directory groups not shown[/dim]")
+
+
+def _iter_report_tables(result: DeduplicationResult, max_groups: int | None = None) -> Iterator["Table"]:
+    """Yield one table per duplicate file group, then one per duplicate directory group, up to max_groups of each."""
+    from rich.table import Table
+
     # Show file duplicates
-    for i, group in enumerate(result.groups, 1):
+    for i, group in enumerate(islice(result.groups, max_groups), 1):
         table = Table(
             title=(f"File Group {i}: {group.checksum[:16]}... " f"({format_size(group.total_size)} total)"),
             show_header=True,
@@ -258,17 +344,16 @@ def show_detailed_report(result: DeduplicationResult, print_func: Callable[...,
         table.add_column("Path")
 
         # Add keep file
-        table.add_row("[green]KEEP[/green]", str(group.keep_file.depth), format_size(group.keep_file.size), str(group.keep_file.path))
+        table.add_row("[green]KEEP[/green]", str(group.keep_file.depth), format_size(group.keep_file.size), group.keep_file.path_str)
 
         # Add remove files
         for file_info in group.remove_files:
-            table.add_row("[red]REMOVE[/red]", str(file_info.depth), format_size(file_info.size), str(file_info.path))
+            table.add_row("[red]REMOVE[/red]", str(file_info.depth), format_size(file_info.size), file_info.path_str)
 
-        print_func(table)
-        print_func("")
+        yield table
 
     # Show directory duplicates
-    for i, dir_group in enumerate(result.directory_groups, 1):
+    for i, dir_group in enumerate(islice(result.directory_groups, max_groups), 1):
         table = Table(
             title=(
                 f"Directory Group {i}: {dir_group.checksum[:16]}... " f"({format_size(dir_group.total_size)} total, {dir_group.total_files} files)"
@@ -295,8 +380,7 @@ def show_detailed_report(result: DeduplicationResult, print_func: Callable[...,
         for dir_info in dir_group.remove_directories:
             table.add_row("[red]REMOVE[/red]", str(dir_info.depth), format_size(dir_info.size), str(dir_info.file_count), str(dir_info.path))
 
-        print_func(table)
-        print_func("")
+        yield table
 
 
 def show_dry_run_summary(
@@ -317,7 +401,7 @@ def show_dry_run_summary(
         total_files_scanned = len(file_scanner.scanned_files)
         total_unique_files = total_files_scanned - result.total_files_to_remove
         unique_files_with_duplicates = len(result.groups)
-        total_file_space = sum(f.size for f in file_scanner.scanned_files)
+        total_file_space = file_scanner.total_bytes
 
     # Directory statistics (only if dir_scanner is provided)
     total_dirs_scanned = 0
@@ -329,10 +413,14 @@ def show_dry_run_summary(
         total_dirs_scanned = len(dir_scanner.scanned_directories)
         total_unique_dirs = total_dirs_scanned - result.total_directories_to_remove
         unique_dirs_with_duplicates = len(result.directory_groups)
-        total_dir_space = sum(d.size for d in dir_scanner.scanned_directories)
+        total_dir_space = dir_scanner.total_bytes
 
     # Calculate combined space statistics
     total_space_scanned = total_file_space + total_dir_space
+    if file_scanner and dir_scanner:
+        # --both records every file from one walk, so both totals cover the same bytes; the root
+        # directory holds them all, and the file total stands in if the root was filtered out
+        total_space_scanned = next((d.size for d in dir_scanner.scanned_directories if d.depth == 0), total_file_space)
     total_space_after_cleanup = total_space_scanned - result.total_space_to_free
     space_savings_percent = (result.total_space_to_free / total_space_scanned * 100) if total_space_scanned > 0 else 0
 
@@ -397,7 +485,9 @@ def show_dry_run_summary(
         print_func(f"\n[red]⚠ {len(result.errors)} errors encountered during analysis[/red]")
 
     # Mode-specific final message
-    if dir_scanner:
+    if dir_scanner and file_scanner:
+        print_func("[yellow]Nothing was modified. Use --delete to replace duplicate files and directories with symbolic links.[/yellow]")
+    elif dir_scanner:
         print_func("[yellow]No directories were modified. Use --delete to replace duplicate directories with symbolic links.[/yellow]")
     else:
         print_func("[yellow]No files were modified. Use --delete to replace duplicate files with symbolic links.[/yellow]")
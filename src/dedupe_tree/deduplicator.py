@@ -1,13 +1,26 @@
 """Duplicate file removal engine with dry-run and report modes."""
 
+import errno
+import functools
 import os
+import re
 import shutil
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from operator import attrgetter
 from pathlib import Path
 from typing import NamedTuple
 
 from .directory_scanner import DirectoryInfo
 from .scanner import FileInfo
 
+# Path fragments that mark a copy as the one to give up, matched in one case-insensitive pass
+# ("recycle" also covers Windows' $Recycle.Bin). Trash folders (Trash, macOS .Trash and .Trashes,
+# the desktop's per-volume .Trash-1000) and ".cache" must be whole path components, so names that
+# merely contain them, such as "trashcan_designs", are not penalized.
+_UNDESIRABLE_PATTERN = re.compile(r"new folder|recycle|(?:^|[\\/])(?:\.?trash(?:es|-\d+)?|\.cache)(?=[\\/]|$)", re.IGNORECASE)
+
 
 class DuplicateGroup(NamedTuple):
     """A group of duplicate files with the file to keep and files to remove."""
@@ -16,6 +29,7 @@ class DuplicateGroup(NamedTuple):
     keep_file: FileInfo
     remove_files: list[FileInfo]
     total_size: int
+    space_to_free: int = 0  # Combined size of remove_files
 
 
 class DuplicateDirectoryGroup(NamedTuple):
@@ -26,6 +40,7 @@ class DuplicateDirectoryGroup(NamedTuple):
     remove_directories: list[DirectoryInfo]
     total_size: int
     total_files: int
+    space_to_free: int = 0  # Combined size of remove_directories
 
 
 class DeduplicationResult(NamedTuple):
@@ -50,24 +65,22 @@ class Deduplicator:
         Calculate path preference score for duplicate file/directory selection.
 
         Priority (lower scores are better):
-        1. Paths WITHOUT 'New Folder' or 'Recycle' (score 0)
-        2. Paths WITH 'New Folder' or 'Recycle' (score 1)
+        1. Paths WITHOUT 'New Folder', 'Recycle', 'Trash' or a '.cache' folder (score 0)
+        2. Paths WITH 'New Folder', 'Recycle', 'Trash' or a '.cache' folder (score 1)
         3. Then by depth (shallower is better)
         4. Then alphabetically by path
 
         Returns:
             Tuple of (undesirable_path_score, depth, path_str) for sorting
         """
-        path_str = str(item.path).lower()
-
-        # Check if path contains undesirable patterns
-        undesirable_patterns = ["new folder", "recycle"]
-        has_undesirable = any(pattern in path_str for pattern in undesirable_patterns)
+        # Files keep their path as a string, so only directories are converted
+        path_str = item.path_str if isinstance(item, FileInfo) else str(item.path)
 
         # Score: 0 for good paths, 1 for paths with undesirable patterns
-        undesirable_score = 1 if has_undesirable else 0
+        undesirable_score = 1 if _UNDESIRABLE_PATTERN.search(path_str) else 0
 
-        return (undesirable_score, item.depth, str(item.path))
+        # depth is the integer precomputed at scan time, so sorting compares it directly
+        return (undesirable_score, item.depth, path_str)
 
     def analyze_duplicates(
         self, duplicate_groups: dict[str, list[FileInfo]], duplicate_directories: dict[str, list[DirectoryInfo]] | None = None
@@ -76,7 +89,7 @@ class Deduplicator:
         Analyze duplicate groups and determine which files/directories to keep/remove.
 
         Strategy:
-        1. Prefer paths WITHOUT 'New Folder' or 'Recycle' in the name
+        1. Prefer paths WITHOUT 'New Folder', 'Recycle', 'Trash' or a '.cache' folder in the name
         2. Then prefer items with the shallowest nesting depth (fewest path parts)
         3. If equal, keep the first one alphabetically
 
@@ -87,38 +100,21 @@ class Deduplicator:
         Returns:
             DeduplicationResult with analysis of what would be removed
         """
-        # Analyze file duplicates
-        groups: list[DuplicateGroup] = []
-        total_files_to_remove = 0
-        total_space_to_free = 0
-
-        for checksum, files in duplicate_groups.items():
-            if len(files) < 2:
-                continue  # Skip non-duplicates
-
-            # Sort by path preference score (avoiding undesirable paths first),
-            # then by depth (ascending), then by path (alphabetically)
-            sorted_files = sorted(files, key=self._get_path_preference_score)
-
-            keep_file = sorted_files[0]  # Best file according to our criteria
-            remove_files = sorted_files[1:]  # All others
-
-            # Calculate total size of files in this group
-            group_size = sum(f.size for f in files)
-            space_to_free = sum(f.size for f in remove_files)
-
-            group = DuplicateGroup(checksum=checksum, keep_file=keep_file, remove_files=remove_files, total_size=group_size)
-
-            groups.append(group)
-            total_files_to_remove += len(remove_files)
-            total_space_to_free += space_to_free
-
         # Analyze directory duplicates
+        # Each group carries the space it frees, so ordering by savings needs no re-summing
         directory_groups: list[DuplicateDirectoryGroup] = []
         total_directories_to_remove = 0
+        total_space_to_free = 0
+
+        # Directories inside one already replaced by a link are covered by that link, so they
+        # are left out; otherwise a nested group could resolve through the link and replace
+        # the kept copy with a link to itself
+        removed_directories: set[str] = set()
 
         if duplicate_directories:
-            for checksum, directories in duplicate_directories.items():
+            for checksum, directories in sorted(duplicate_directories.items(), key=_enclosing_first):
+                if removed_directories:
+                    directories = [d for d in directories if not _is_inside(str(d.path), removed_directories)]
                 if len(directories) < 2:
                     continue  # Skip non-duplicates
 
@@ -139,15 +135,47 @@ class Deduplicator:
                     remove_directories=remove_directories,
                     total_size=group_size,
                     total_files=group_files,
+                    space_to_free=space_to_free_dirs,
                 )
 
                 directory_groups.append(dir_group)
+                removed_directories.update(str(d.path) for d in remove_directories)
                 total_directories_to_remove += len(remove_directories)
                 total_space_to_free += space_to_free_dirs
 
+        # Analyze file duplicates
+        groups: list[DuplicateGroup] = []
+        total_files_to_remove = 0
+
+        # Likewise files inside a removed directory are left out rather than linked and counted a second time
+        for checksum, files in duplicate_groups.items():
+            if removed_directories:
+                files = [f for f in files if not _is_inside(f.path_str, removed_directories)]
+            if len(files) < 2:
+                continue  # Skip non-duplicates
+
+            # Sort by path preference score (avoiding undesirable paths first),
+            # then by depth (ascending), then by path (alphabetically)
+            sorted_files = sorted(files, key=self._get_path_preference_score)
+
+            keep_file = sorted_files[0]  # Best file according to our criteria
+            remove_files = sorted_files[1:]  # All others
+
+            # Calculate total size of files in this group
+            group_size = sum(f.size for f in files)
+            space_to_free = sum(f.size for f in remove_files)
+
+            group = DuplicateGroup(
+                checksum=checksum, keep_file=keep_file, remove_files=remove_files, total_size=group_size, space_to_free=space_to_free
+            )
+
+            groups.append(group)
+            total_files_to_remove += len(remove_files)
+            total_space_to_free += space_to_free
+
         # Sort groups by space to be freed (descending order - largest savings first)
-        groups.sort(key=lambda g: sum(f.size for f in g.remove_files), reverse=True)
-        directory_groups.sort(key=lambda g: sum(d.size for d in g.remove_directories), reverse=True)
+        groups.sort(key=attrgetter("space_to_free"), reverse=True)
+        directory_groups.sort(key=attrgetter("space_to_free"), reverse=True)
 
         return DeduplicationResult(
             groups=groups,
@@ -158,60 +186,172 @@ class Deduplicator:
             errors=self.errors.copy(),
         )
 
-    def execute_removal(self, result: DeduplicationResult, dry_run: bool = True) -> tuple[list[Path], list[Path]]:
+    def execute_removal(
+        self, result: DeduplicationResult, dry_run: bool = True, max_workers: int | None = None, use_symlinks: bool = True
+    ) -> tuple[list[Path], list[Path]]:
         """
         Replace duplicate files and directories with symbolic links.
 
         Args:
             result: DeduplicationResult from analyze_duplicates
             dry_run: If True, don't actually create symbolic links
+            max_workers: Number of threads replacing items concurrently. If None, uses the ThreadPoolExecutor default.
+            use_symlinks: If False, duplicate files are replaced with hard links to the kept file instead,
+                falling back to symbolic links where the filesystem cannot link them (such as across
+                devices). A hard link stays valid if the kept file is moved or deleted, but is
+                indistinguishable from it, so it is no longer apparent which copy was kept.
+                Directories are always replaced with symbolic links.
 
         Returns:
             Tuple of (linked_files, linked_directories)
         """
-        linked_files: list[Path] = []
-        linked_directories: list[Path] = []
-
-        # Replace duplicate files with symbolic links
-        for group in result.groups:
-            for file_info in group.remove_files:
-                try:
-                    if not dry_run:
-                        # Remove the duplicate file
-                        os.remove(file_info.path)
-                        # Create symbolic link to the kept file
-                        os.symlink(group.keep_file.path, file_info.path)
-                    linked_files.append(file_info.path)
-
-                except (OSError, PermissionError) as e:
-                    self.errors.append((file_info.path, e))
-
-        # Replace duplicate directories with symbolic links
-        for dir_group in result.directory_groups:
-            for dir_info in dir_group.remove_directories:
-                try:
-                    if not dry_run:
-                        # Remove the duplicate directory
-                        shutil.rmtree(dir_info.path)
-                        # Create symbolic link to the kept directory
-                        os.symlink(dir_group.keep_directory.path, dir_info.path)
-                    linked_directories.append(dir_info.path)
-
-                except (OSError, PermissionError) as e:
-                    self.errors.append((dir_info.path, e))
+        # Swap duplicate files, then duplicate directories, for symbolic links to the kept copies
+        file_jobs = [(file_info.path, group.keep_file.path) for group in result.groups for file_info in group.remove_files]
+        dir_jobs = [(dir_info.path, group.keep_directory.path) for group in result.directory_groups for dir_info in group.remove_directories]
+
+        if dry_run:
+            return [path for path, _ in file_jobs], [path for path, _ in dir_jobs]
+
+        # Renames, symlinks and rmtree are syscalls that release the GIL, so they overlap well. Nothing
+        # inside a removed directory is grouped, neither files nor nested directories, so both kinds
+        # are queued at once and directory deletions need not wait for the last file to be linked.
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            replace_file = _replace_file_with_symlink if use_symlinks else _replace_file_with_hard_link
+            file_outcomes = pool.map(_try_replace, file_jobs, repeat(replace_file))
+            dir_outcomes = pool.map(_try_replace, dir_jobs, repeat(_replace_directory_with_symlink))
+            linked_files = self._collect_links(file_jobs, file_outcomes)
+            linked_directories = self._collect_links(dir_jobs, dir_outcomes)
 
         return linked_files, linked_directories
 
+    def _collect_links(self, jobs: list[tuple[Path, Path]], outcomes: Iterable[OSError | None]) -> list[Path]:
+        """Return the paths that were linked, in job order, recording failures in errors."""
+        linked: list[Path] = []
+        for (path, _), error in zip(jobs, outcomes, strict=True):
+            if error is None:
+                linked.append(path)
+            else:
+                self.errors.append((path, error))
+        return linked
+
     def clear_errors(self) -> None:
         """Clear accumulated errors."""
         self.errors.clear()
 
 
+def _is_inside(path: str, directories: set[str]) -> bool:
+    """Return whether any ancestor of path is one of directories, walking up by string rather than building Path.parents."""
+    parent = os.path.dirname(path)
+    while parent not in directories:
+        grandparent = os.path.dirname(parent)
+        if grandparent == parent:
+            return False
+        parent = grandparent
+    return True
+
+
+def _enclosing_first(item: tuple[str, list[DirectoryInfo]]) -> tuple[int, int]:
+    """
+    Sort key putting groups of enclosing directories before groups of directories nested in them.
+
+    Members of a group share one size, and a directory holds at least as many bytes as any
+    directory inside it and is shallower, so larger groups come first, then shallower ones.
+    """
+    directories = item[1]
+    if not directories:
+        return (0, 0)
+    return (-directories[0].size, min(d.depth for d in directories))
+
+
+def _try_replace(job: tuple[Path, Path], replace: Callable[[Path, Path], None]) -> OSError | None:
+    """Run one replacement, returning the error instead of raising it."""
+    try:
+        replace(*job)
+    except OSError as e:
+        return e
+    return None
+
+
+def _temporary_sibling(path: Path, tag: str) -> Path:
+    """Return a hidden name next to path for staging a replacement."""
+    return path.with_name(f".{path.name}.{os.getpid()}.dedupe-{tag}")
+
+
+def _replace_file_with_symlink(path: Path, target: Path) -> None:
+    """
+    Atomically replace a file with a symbolic link to target.
+
+    The link is created under a temporary name and renamed over the file, so the
+    path never goes missing and a failure leaves the original file in place.
+    """
+    staged = _temporary_sibling(path, "link")
+    os.symlink(target, staged)
+    try:
+        os.replace(staged, path)
+    except OSError:
+        os.unlink(staged)
+        raise
+
+
+def _replace_file_with_hard_link(path: Path, target: Path) -> None:
+    """
+    Atomically replace a file with a hard link to target, staged like _replace_file_with_symlink.
+
+    Where target's filesystem cannot link to path, across devices or on filesystems
+    without hard links, a symbolic link is made instead.
+    """
+    staged = _temporary_sibling(path, "link")
+    try:
+        os.link(target, staged)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM):
+            raise
+        _replace_file_with_symlink(path, target)
+        return
+    try:
+        os.replace(staged, path)
+    except OSError:
+        os.unlink(staged)
+        raise
+
+
+def _replace_directory_with_symlink(path: Path, target: Path) -> None:
+    """
+    Replace a directory with a symbolic link to target.
+
+    A directory cannot be renamed over, so it is moved aside and the staged link
+    renamed into place before the old tree is deleted; the path is only absent
+    between the two renames, and a failure before deletion restores the directory.
+    """
+    staged = _temporary_sibling(path, "link")
+    aside = _temporary_sibling(path, "old")
+    # Windows creates file links unless told otherwise; elsewhere the flag is ignored
+    os.symlink(target, staged, target_is_directory=True)
+    try:
+        os.rename(path, aside)
+    except OSError:
+        os.unlink(staged)
+        raise
+    try:
+        os.rename(staged, path)
+    except OSError:
+        os.rename(aside, path)
+        os.unlink(staged)
+        raise
+    shutil.rmtree(aside)
+
+
+_SIZE_UNITS = ("B", "KB", "MB", "GB", "TB", "PB")
+# Reciprocals of powers of two are exact, so multiplying by them matches dividing
+_SIZE_SCALES = tuple(1.0 / (1 << (index * 10)) for index in range(len(_SIZE_UNITS)))
+
+
+# Reports format the same few sizes over and over (every file in a group shares one)
+@functools.lru_cache(maxsize=4096)
 def format_size(size_bytes: int) -> str:
     """Format file size in human-readable format."""
-    size_float = float(size_bytes)
-    for unit in ["B", "KB", "MB", "GB", "TB"]:
-        if size_float < 1024.0:
-            return f"{size_float:.1f} {unit}"
-        size_float /= 1024.0
-    return f"{size_float:.1f} PB"
+    if size_bytes < 1024:
+        return f"{size_bytes:.1f} B"
+    # Each unit is a factor of 2**10, so the bit length picks the unit without a division loop
+    index = min((int(size_bytes).bit_length() - 1) // 10, len(_SIZE_UNITS) - 1)
+    return f"{size_bytes * _SIZE_SCALES[index]:.1f} {_SIZE_UNITS[index]}"
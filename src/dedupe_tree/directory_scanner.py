@@ -1,11 +1,18 @@
 """Directory tree scanning and checksum calculation for duplicate directory detection."""
 
-import hashlib
-import subprocess
+import os
+import threading
+from array import array
+from collections import Counter, defaultdict
+from collections.abc import Collection
+from concurrent.futures import Executor, ThreadPoolExecutor
+from itertools import compress
 from pathlib import Path
 from typing import NamedTuple
 
 from .cache import ChecksumCache
+from .hashing import hash_bytes
+from .scanner import FileInfo, FileScanner, _suffix_tuple, checksum_candidates
 
 
 class DirectoryInfo(NamedTuple):
@@ -18,23 +25,68 @@ class DirectoryInfo(NamedTuple):
     depth: int  # Directory nesting depth
 
 
+class _Listing(NamedTuple):
+    """A directory's sorted entries, held between listing the tree and calculating its checksums."""
+
+    path: str
+    lines: list[str]  # Fingerprint lines, with file and subdirectory lines filled in once known
+    files: list[tuple[int, str, FileInfo]]  # (line index, name, file)
+    subdirectories: list[tuple[int, str, str]]  # (line index, name, path)
+
+
 class DirectoryScanner:
     """Scans directory trees and calculates checksums for duplicate detection."""
 
-    def __init__(self, cache: ChecksumCache | None = None) -> None:
+    def __init__(self, cache: ChecksumCache | None = None, max_workers: int | None = None) -> None:
+        """
+        Initialize scanner.
+
+        Args:
+            cache: Checksum cache to use. If None, opens the default cache.
+            max_workers: Number of threads hashing files concurrently. If None, uses the ThreadPoolExecutor default.
+        """
         self.cache = cache or ChecksumCache()
+        self.max_workers = max_workers
         self.scanned_directories: list[DirectoryInfo] = []
+        # Directory sizes kept in a parallel C array so totals are summed without touching DirectoryInfo objects
+        self.sizes = array("q")
+        # Running sum of sizes, so reports need not add them up again
+        self.total_bytes = 0
         self.errors: list[tuple[Path, Exception]] = []
-        self._directory_checksums: dict[Path, str] = {}
-        self._directory_metadata: dict[Path, tuple[int, int]] = {}  # (size, file_count)
-
-    def scan_directory_tree(self, root_path: Path, min_files: int = 2) -> None:
+        # Directories passed over by scan_directory_tree's min_size filter
+        self.skipped_small = 0
+        # Keyed by os.fspath() strings, which hash and compare faster than Path objects
+        self._directory_checksums: dict[str, str] = {}
+        self._directory_metadata: dict[str, tuple[int, int]] = {}  # (size, file_count)
+        # Fingerprint lines kept as hashed, so get_directory_fingerprint need not walk and hash again;
+        # the lines are the listings' own, so no joined copy of every fingerprint is held
+        self._directory_fingerprints: dict[str, list[str]] = {}
+        # Files with several hard links, by (device, inode)
+        self._linked_files: dict[tuple[int, int], FileInfo] = {}
+        # Guards _linked_files and the directory dictionaries, as subtrees are listed from several threads
+        self._lock = threading.Lock()
+
+    def scan_directory_tree(
+        self,
+        root_path: Path,
+        min_files: int = 2,
+        min_size: int = 0,
+        file_scanner: FileScanner | None = None,
+        extensions: Collection[str] | None = None,
+        min_file_size: int = 0,
+    ) -> None:
         """
         Scan directory tree and calculate checksums for all subdirectories.
 
         Args:
             root_path: Root directory to scan
             min_files: Minimum number of files a directory must contain to be considered
+            min_size: Skip directories smaller than this many bytes, counting them in skipped_small
+            file_scanner: If given, files seen by this walk are also recorded there, so file
+                duplicates can be found without walking the tree again; their checksums are
+                served from the shared cache rather than re-read
+            extensions: Extension filter applied to files recorded in file_scanner
+            min_file_size: Size filter applied to files recorded in file_scanner
         """
         if not root_path.exists():
             raise FileNotFoundError(f"Directory not found: {root_path}")
@@ -42,113 +94,276 @@ class DirectoryScanner:
         if not root_path.is_dir():
             raise NotADirectoryError(f"Path is not a directory: {root_path}")
 
-        # First pass: Calculate checksums bottom-up
-        self._calculate_directory_checksums(root_path)
+        # First pass: List the tree, hash files that could be duplicated, then calculate checksums bottom-up
+        # Converted once here, so recording each file skips the conversion
+        suffixes = _suffix_tuple(extensions)
+        listings: list[_Listing] = []
+        root = os.fspath(root_path)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            self._list_directory(root, listings, self.errors, file_scanner, suffixes, min_file_size, pool)
+
+            self.cache.begin()
+            file_checksums = self._hash_candidate_files(listings, pool)
+            self.cache.commit_batch()
 
-        # Second pass: Create DirectoryInfo objects for directories with enough files
+        for listing in listings:
+            self._calculate_directory_checksum(listing, file_checksums)
+
+        # Depth is the separator count past the root's, which avoids splitting every path into parts
+        root_separators = root.rstrip(os.sep).count(os.sep)
+
+        # Second pass: Create DirectoryInfo objects for directories with enough files and bytes
         for dir_path, checksum in self._directory_checksums.items():
             size, file_count = self._directory_metadata[dir_path]
-            if file_count >= min_files:
-                depth = len(dir_path.relative_to(root_path).parts)
-                dir_info = DirectoryInfo(path=dir_path, checksum=checksum, size=size, file_count=file_count, depth=depth)
-                self.scanned_directories.append(dir_info)
+            if file_count < min_files:
+                continue
+            # Small directories are filtered here so they are never materialized
+            if size < min_size:
+                self.skipped_small += 1
+                continue
+            depth = dir_path.count(os.sep) - root_separators if dir_path != root else 0
+            dir_info = DirectoryInfo(path=Path(dir_path), checksum=checksum, size=size, file_count=file_count, depth=depth)
+            self.scanned_directories.append(dir_info)
+            self.sizes.append(size)
+            self.total_bytes += size
+
+    def apply_min_size(self, min_size: int) -> int:
+        """
+        Drop scanned directories smaller than min_size.
+
+        Returns:
+            Number of directories removed
+        """
+        original_count = len(self.scanned_directories)
+        keep = [size >= min_size for size in self.sizes]
+        self.scanned_directories = list(compress(self.scanned_directories, keep))
+        self.sizes = array("q", compress(self.sizes, keep))
+        self.total_bytes = sum(self.sizes)
+        return original_count - len(self.scanned_directories)
+
+    def _list_directory(
+        self,
+        directory: str,
+        listings: list[_Listing],
+        errors: list[tuple[Path, Exception]],
+        file_scanner: FileScanner | None = None,
+        suffixes: tuple[str, ...] | None = None,
+        min_file_size: int = 0,
+        pool: Executor | None = None,
+    ) -> None:
+        """
+        List a directory tree into listings in post-order, recording files in file_scanner if given.
+
+        Directories that cannot be listed get an error checksum straight away and no listing.
+        If pool is given, the directory's subtrees are listed concurrently on it; listing is
+        mostly directory reads and stats that release the GIL, so sibling subtrees overlap
+        their I/O waits. Subtrees are listed serially below that level. Errors are appended
+        to errors; each concurrent subtree collects its own, merged in name order, so the
+        order does not depend on which thread finishes first.
+        """
+        if pool is None:
+            self._list_tree(directory, listings, errors, file_scanner, suffixes, min_file_size)
+            return
+
+        listing, subdirectories = self._list_entries(directory, errors, file_scanner, suffixes, min_file_size)
+        if listing is None:
+            return
+        subtrees = [
+            pool.submit(self._list_subtree, subdirectory, subdir_scanner, suffixes, min_file_size) for subdirectory, subdir_scanner in subdirectories
+        ]
+        # Each subtree's listings are already in post-order, so appending them whole keeps children before parents
+        for subtree in subtrees:
+            subtree_listings, subtree_errors = subtree.result()
+            listings.extend(subtree_listings)
+            errors.extend(subtree_errors)
+        listings.append(listing)
+
+    def _list_tree(
+        self,
+        directory: str,
+        listings: list[_Listing],
+        errors: list[tuple[Path, Exception]],
+        file_scanner: FileScanner | None,
+        suffixes: tuple[str, ...] | None,
+        min_file_size: int,
+    ) -> None:
+        """
+        List a directory tree into listings in post-order on the calling thread.
 
-    def _calculate_directory_checksums(self, directory: Path) -> str:
+        The walk keeps an explicit stack rather than recursing, so trees deeper than the
+        recursion limit are listed like any other. A directory's listing goes back on the
+        stack below its subdirectories and is appended once they have all been listed.
         """
-        Recursively calculate directory checksums bottom-up.
+        # (path, file scanner, listing); the listing is None until the directory has been listed
+        stack: list[tuple[str, FileScanner | None, _Listing | None]] = [(directory, file_scanner, None)]
+        while stack:
+            path, scanner, listing = stack.pop()
+            if listing is not None:
+                listings.append(listing)
+                continue
+            listing, subdirectories = self._list_entries(path, errors, scanner, suffixes, min_file_size)
+            if listing is None:
+                continue
+            stack.append((path, scanner, listing))
+            # Pushed in reverse, so subdirectories are listed in name order
+            stack.extend((subdirectory, subdir_scanner, None) for subdirectory, subdir_scanner in reversed(subdirectories))
+
+    def _list_entries(
+        self,
+        directory: str,
+        errors: list[tuple[Path, Exception]],
+        file_scanner: FileScanner | None,
+        suffixes: tuple[str, ...] | None,
+        min_file_size: int,
+    ) -> tuple[_Listing | None, list[tuple[str, FileScanner | None]]]:
+        """
+        List one directory's entries, recording its files in file_scanner if given.
 
         Returns:
-            SHA256 checksum of the directory's contents
+            The directory's listing, or None if it was already checksummed or cannot be listed,
+            and the (path, file scanner) of each subdirectory still to be listed, in name order
         """
         if directory in self._directory_checksums:
-            return self._directory_checksums[directory]
+            return None, []
 
+        # Get all entries and sort them alphabetically for consistency; DirEntry
+        # carries the file type from the listing and caches its stat. Names that differ
+        # only in case are ordered by the exact name, so the order never depends on the
+        # listing's; names are unique, so the entries themselves are never compared.
         try:
-            entries = []
-            total_size = 0
-            total_files = 0
-
-            # Get all entries and sort them alphabetically for consistency
-            try:
-                all_entries = sorted(directory.iterdir(), key=lambda p: p.name.lower())
-            except (OSError, PermissionError) as e:
-                self.errors.append((directory, e))
-                # Return a placeholder checksum for inaccessible directories
-                placeholder_checksum = hashlib.sha256(f"ERROR:{directory}".encode()).hexdigest()
-                self._directory_checksums[directory] = placeholder_checksum
+            with os.scandir(directory) as entries:
+                all_entries = [entry for _, _, entry in sorted((e.name.casefold(), e.name, e) for e in entries)]
+        except (OSError, PermissionError) as e:
+            errors.append((Path(directory), e))
+            # Record a placeholder checksum for inaccessible directories
+            checksum = hash_bytes(f"ERROR:{directory}".encode(), self.cache.algorithm)
+            with self._lock:
+                self._directory_checksums[directory] = checksum
                 self._directory_metadata[directory] = (0, 0)
-                return placeholder_checksum
-
-            for entry in all_entries:
-                try:
-                    if entry.is_file():
-                        # Calculate file checksum
-                        file_checksum = self._get_file_checksum(entry)
-                        file_size = entry.stat().st_size
-                        entries.append(f"F:{entry.name}:{file_size}:{file_checksum}")
-                        total_size += file_size
-                        total_files += 1
-
-                    elif entry.is_dir():
-                        # Recursively calculate subdirectory checksum
-                        subdir_checksum = self._calculate_directory_checksums(entry)
-                        entries.append(f"D:{entry.name}:{subdir_checksum}")
-
-                        # Add subdirectory's metadata to totals
-                        if entry in self._directory_metadata:
-                            subdir_size, subdir_files = self._directory_metadata[entry]
-                            total_size += subdir_size
-                            total_files += subdir_files
-
-                except (OSError, PermissionError) as e:
-                    self.errors.append((entry, e))
-                    # Include error entries in checksum to maintain consistency
-                    entries.append(f"ERROR:{entry.name}")
-
-            # Create directory fingerprint and calculate checksum
-            directory_fingerprint = "\n".join(entries)
-            directory_checksum = hashlib.sha256(directory_fingerprint.encode()).hexdigest()
-
-            # Cache the results
-            self._directory_checksums[directory] = directory_checksum
-            self._directory_metadata[directory] = (total_size, total_files)
-
-            return directory_checksum
-
-        except Exception as e:
-            self.errors.append((directory, e))
-            # Return error checksum
-            error_checksum = hashlib.sha256(f"ERROR:{directory}".encode()).hexdigest()
-            self._directory_checksums[directory] = error_checksum
-            self._directory_metadata[directory] = (0, 0)
-            return error_checksum
-
-    def _get_file_checksum(self, file_path: Path) -> str:
-        """Get file checksum, using cache if available."""
-        try:
-            stat = file_path.stat()
-            file_size = stat.st_size
-            modification_time = stat.st_mtime
+            return None, []
 
-            # Try cache first
-            if self.cache:
-                cached_checksum = self.cache.get_checksum(file_path, file_size, modification_time)
-                if cached_checksum:
-                    return cached_checksum
-
-            # Calculate checksum using sha256sum
-            result = subprocess.run(["sha256sum", str(file_path)], capture_output=True, text=True, check=True)
-            checksum = result.stdout.split()[0]
+        listing = _Listing(directory, [], [], [])
+        subdirectories: list[tuple[str, FileScanner | None]] = []
+        for entry in all_entries:
+            try:
+                if entry.is_file():
+                    # A file the file scanner keeps is shared with it, so a checksum computed
+                    # here is already on the FileInfo when file duplicates are grouped
+                    # Hard links to one inode share a FileInfo, so its contents are read at most once
+                    stat_result = entry.stat()
+                    if stat_result.st_nlink > 1:
+                        # Looked up and recorded under the lock, so links listed by two subtrees at once get one FileInfo
+                        with self._lock:
+                            inode = (stat_result.st_dev, stat_result.st_ino)
+                            file_info = self._linked_files.get(inode)
+                            if file_info is None:
+                                file_info = self._record_file(entry, stat_result, file_scanner, suffixes, min_file_size)
+                                self._linked_files[inode] = file_info
+                    else:
+                        file_info = self._record_file(entry, stat_result, file_scanner, suffixes, min_file_size)
+                    listing.files.append((len(listing.lines), entry.name, file_info))
+                    listing.lines.append("")
+
+                elif entry.is_dir():
+                    entry_path = entry.path
+                    # Like FileScanner.scan_directory, files behind symlinked directories are not recorded
+                    subdirectories.append((entry_path, None if entry.is_symlink() else file_scanner))
+                    listing.subdirectories.append((len(listing.lines), entry.name, entry_path))
+                    listing.lines.append("")
 
-            # Store in cache
-            if self.cache:
-                self.cache.store_checksum(file_path, file_size, modification_time, checksum)
+            except (OSError, PermissionError) as e:
+                errors.append((Path(entry.path), e))
+                # Include error entries in checksum to maintain consistency
+                listing.lines.append(f"ERROR:{entry.name}")
+
+        return listing, subdirectories
+
+    def _record_file(
+        self,
+        entry: os.DirEntry[str],
+        stat_result: os.stat_result,
+        file_scanner: FileScanner | None,
+        suffixes: tuple[str, ...] | None,
+        min_file_size: int,
+    ) -> FileInfo:
+        """Return a listed file's FileInfo, the one recorded in file_scanner if it keeps the file."""
+        file_info = None
+        if file_scanner is not None and not entry.is_symlink():
+            file_info = file_scanner.add_entry(entry, suffixes, min_file_size)
+        return file_info if file_info is not None else FileInfo(entry.path, self.cache, stat_result)
+
+    def _list_subtree(
+        self, directory: str, file_scanner: FileScanner | None, suffixes: tuple[str, ...] | None, min_file_size: int
+    ) -> tuple[list[_Listing], list[tuple[Path, Exception]]]:
+        """List one subtree into listings and errors of its own, so subtrees listed concurrently never share a list."""
+        listings: list[_Listing] = []
+        errors: list[tuple[Path, Exception]] = []
+        self._list_tree(directory, listings, errors, file_scanner, suffixes, min_file_size)
+        return listings, errors
+
+    def _hash_candidate_files(self, listings: list[_Listing], pool: Executor) -> dict[FileInfo, str]:
+        """
+        Checksum, on pool, every listed file whose directory could match another listed directory.
 
-            return checksum
+        A directory holding, anywhere below it, a file whose size no other listed file
+        shares cannot match another directory, and its files are not read unless a
+        subdirectory could still match. Of the remaining files, as in
+        FileScanner.get_duplicates, only those sharing their size with another are
+        considered, and large ones are fully read only if their first HEAD_SIZE bytes
+        match another's. A file passed over gets a checksum derived from its path
+        instead, which keeps its directory's checksum unique without reading the file.
 
-        except (subprocess.CalledProcessError, FileNotFoundError, IndexError, OSError):
-            # Return a consistent error checksum
-            return hashlib.sha256(f"ERROR:{file_path}".encode()).hexdigest()
+        Returns:
+            Dictionary mapping each listed file to its checksum
+        """
+        # Sizes are counted per listed link, so directories holding links to one file can still match.
+        # Listings are in post-order, so subdirectories are decided before their parents; one that
+        # could not be listed has an error checksum and never matches.
+        size_counts = Counter(file_info.size for listing in listings for _, _, file_info in listing.files)
+        matchable: dict[str, bool] = {}
+        for listing in listings:
+            matchable[listing.path] = all(size_counts[file_info.size] > 1 for _, _, file_info in listing.files) and all(
+                matchable.get(subdirectory, False) for _, _, subdirectory in listing.subdirectories
+            )
+
+        # A hard-linked file is listed once per link but grouped once, so links never pair with each other
+        size_groups: defaultdict[int, list[FileInfo]] = defaultdict(list)
+        for file_info in dict.fromkeys(file_info for listing in listings if matchable[listing.path] for _, _, file_info in listing.files):
+            size_groups[file_info.size].append(file_info)
+
+        candidate_groups = [group for group in size_groups.values() if len(group) > 1]
+        file_checksums = dict(checksum_candidates(self.cache, pool, candidate_groups, self.errors))
+
+        for listing in listings:
+            for _, _, file_info in listing.files:
+                if file_info not in file_checksums:
+                    file_checksums[file_info] = hash_bytes(f"UNIQUE:{file_info.path_str}".encode(), self.cache.algorithm)
+        return file_checksums
+
+    def _calculate_directory_checksum(self, listing: _Listing, file_checksums: dict[FileInfo, str]) -> None:
+        """Calculate a listed directory's checksum and totals; its subdirectories must already have theirs."""
+        lines = listing.lines
+        total_size = 0
+        # Files are counted once here rather than incremented per line
+        total_files = len(listing.files)
+
+        for index, name, file_info in listing.files:
+            file_size = file_info.size
+            lines[index] = f"F:{name}:{file_size}:{file_checksums[file_info]}"
+            total_size += file_size
+
+        for index, name, subdirectory in listing.subdirectories:
+            lines[index] = f"D:{name}:{self._directory_checksums[subdirectory]}"
+
+            # Add subdirectory's metadata to totals
+            subdir_size, subdir_files = self._directory_metadata[subdirectory]
+            total_size += subdir_size
+            total_files += subdir_files
+
+        # Calculate the checksum from the fingerprint, joined and encoded only for the one hash call
+        self._directory_fingerprints[listing.path] = lines
+        self._directory_checksums[listing.path] = hash_bytes("\n".join(lines).encode(), self.cache.algorithm)
+        self._directory_metadata[listing.path] = (total_size, total_files)
 
     def get_duplicate_directories(self) -> dict[str, list[DirectoryInfo]]:
         """
@@ -157,11 +372,9 @@ class DirectoryScanner:
         Returns:
             Dictionary mapping checksums to lists of directories with that checksum
         """
-        checksum_groups: dict[str, list[DirectoryInfo]] = {}
+        checksum_groups: defaultdict[str, list[DirectoryInfo]] = defaultdict(list)
 
         for dir_info in self.scanned_directories:
-            if dir_info.checksum not in checksum_groups:
-                checksum_groups[dir_info.checksum] = []
             checksum_groups[dir_info.checksum].append(dir_info)
 
         # Return only groups with duplicates (more than 1 directory)
@@ -170,29 +383,16 @@ class DirectoryScanner:
     def clear(self) -> None:
         """Clear all scanned data."""
         self.scanned_directories.clear()
+        self.sizes = array("q")
+        self.total_bytes = 0
         self.errors.clear()
+        self.skipped_small = 0
         self._directory_checksums.clear()
         self._directory_metadata.clear()
+        self._directory_fingerprints.clear()
+        self._linked_files.clear()
 
     def get_directory_fingerprint(self, directory: Path) -> str | None:
         """Get the detailed fingerprint string for a directory (for debugging)."""
-        if directory not in self._directory_checksums:
-            return None
-
-        try:
-            entries = []
-            all_entries = sorted(directory.iterdir(), key=lambda p: p.name.lower())
-
-            for entry in all_entries:
-                if entry.is_file():
-                    file_checksum = self._get_file_checksum(entry)
-                    file_size = entry.stat().st_size
-                    entries.append(f"F:{entry.name}:{file_size}:{file_checksum}")
-                elif entry.is_dir() and entry in self._directory_checksums:
-                    subdir_checksum = self._directory_checksums[entry]
-                    entries.append(f"D:{entry.name}:{subdir_checksum}")
-
-            return "\n".join(entries)
-
-        except Exception:
-            return None
+        lines = self._directory_fingerprints.get(os.fspath(directory))
+        return None if lines is None else "\n".join(lines)
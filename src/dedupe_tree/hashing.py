@@ -0,0 +1,216 @@
+"""File content hashing."""
+
+import hashlib
+import mmap
+import os
+from collections.abc import Iterator
+
+try:
+    import blake3
+except ImportError:  # Optional: pip install 'dedupe-tree[fast]'
+    blake3 = None  # type: ignore[assignment]
+
+# Algorithms accepted by hash_file(); checksums are always returned as hex strings.
+# Matching checksums alone decide which files are replaced with links, so only
+# collision-resistant 256-bit hashes are offered: a fast non-cryptographic hash such
+# as xxh3 lets a crafted or unlucky file pass as another's duplicate and replace it.
+HASH_ALGORITHMS = ("blake3", "sha256")
+
+# BLAKE3 is several times faster than SHA256, so it is preferred whenever it is installed
+DEFAULT_HASH_ALGORITHM = "blake3" if blake3 is not None else "sha256"
+
+# Bytes read per readinto() call when hashing in-process
+_CHUNK_SIZE = 1 << 20
+
+# Files at least this large are memory-mapped, so pages are hashed in place from the
+# page cache instead of being copied through Python buffers
+MMAP_THRESHOLD = 4 << 20
+
+# Files at least this large are also hashed by BLAKE3 across all cores;
+# smaller ones stay single-threaded to avoid spinning up threads
+LARGE_FILE_THRESHOLD = 16 << 20
+
+# Leading bytes compared before committing to a full read; most distinct files differ here
+HEAD_SIZE = 64 << 10
+
+
+def is_available(algorithm: str) -> bool:
+    """Return whether the given hash algorithm can be used in this environment."""
+    if algorithm == "blake3":
+        return blake3 is not None
+    return algorithm in HASH_ALGORITHMS
+
+
+def hash_file(path: str, algorithm: str = DEFAULT_HASH_ALGORITHM, size: int | None = None) -> str:
+    """
+    Calculate the checksum of a file's contents.
+
+    Args:
+        path: Path to the file as a string
+        algorithm: One of HASH_ALGORITHMS
+        size: File size if already known; used to pick the large-file strategy
+
+    Returns:
+        Hex digest of the file contents
+
+    Raises:
+        OSError: If the file cannot be read or hashed
+        ValueError: If the algorithm is unknown or not installed
+    """
+    if not is_available(algorithm):
+        raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+
+    try:
+        if size is None:
+            size = os.path.getsize(path)
+        if algorithm == "blake3":
+            if size >= MMAP_THRESHOLD:
+                return _blake3_file_mmap(path, parallel=size >= LARGE_FILE_THRESHOLD)
+            return _blake3_file(path, sequential=size >= _CHUNK_SIZE)
+        if size >= MMAP_THRESHOLD:
+            return _sha256_file_mmap(path)
+        return _sha256_file(path, sequential=size >= _CHUNK_SIZE)
+    except OSError as e:
+        # Fall back to a descriptive error that will be caught by the caller
+        raise OSError(f"Failed to calculate checksum for {path}: {e}") from e
+
+
+def hash_head(path: str, algorithm: str = DEFAULT_HASH_ALGORITHM, length: int = HEAD_SIZE) -> str:
+    """
+    Calculate the checksum of the first bytes of a file.
+
+    Args:
+        path: Path to the file as a string
+        algorithm: One of HASH_ALGORITHMS
+        length: Number of leading bytes to hash
+
+    Returns:
+        Hex digest of the file's first ``length`` bytes
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If the algorithm is unknown or not installed
+    """
+    if not is_available(algorithm):
+        raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+
+    try:
+        with open(path, "rb") as f:
+            data = f.read(length)
+    except OSError as e:
+        raise OSError(f"Failed to calculate checksum for {path}: {e}") from e
+
+    return hash_bytes(data, algorithm)
+
+
+def hash_bytes(data: bytes, algorithm: str = DEFAULT_HASH_ALGORITHM) -> str:
+    """
+    Calculate the checksum of an in-memory buffer.
+
+    Args:
+        data: Bytes to hash
+        algorithm: One of HASH_ALGORITHMS
+
+    Returns:
+        Hex digest of data, as hash_file would return for a file holding it
+    """
+    digest: str = blake3.blake3(data).hexdigest() if algorithm == "blake3" else hashlib.sha256(data).hexdigest()
+    return digest
+
+
+def _read_chunks(path: str, sequential: bool = True) -> Iterator[memoryview]:
+    """
+    Yield a file's contents in large chunks, hinting sequential access to the kernel.
+
+    Chunks are views of one reused buffer, filled by unbuffered readinto() calls,
+    so each is only valid until the next one is requested. Once the whole file has
+    been read its pages are released, see _release_pages(). A file known to fit in
+    one chunk is read in a single call, so the sequential hint is skipped for it by
+    passing sequential=False, saving a syscall per small file.
+    """
+    with open(path, "rb", buffering=0) as f:
+        if sequential and hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        buffer = memoryview(bytearray(_CHUNK_SIZE))
+        while n := f.readinto(buffer):
+            yield buffer[:n]
+        _release_pages(f.fileno())
+
+
+def _release_pages(fd: int) -> None:
+    """
+    Tell the kernel a fully hashed file's cached pages will not be needed again.
+
+    Each file is read in full at most once per scan, so keeping its pages would only
+    push out the page cache of other programs while terabytes stream through.
+    """
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def _release_path_pages(path: str) -> None:
+    """Release a fully hashed file's cached pages, see _release_pages(), for a file read by path elsewhere."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        # The digest is already known; a file gone since only keeps nothing cached
+        return
+    try:
+        _release_pages(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _blake3_file(path: str, sequential: bool = True) -> str:
+    """Hash a file with BLAKE3, whose native backend picks the best SIMD path at runtime."""
+    hasher = blake3.blake3()
+    for chunk in _read_chunks(path, sequential):
+        hasher.update(chunk)
+    digest: str = hasher.hexdigest()
+    return digest
+
+
+def _blake3_file_mmap(path: str, parallel: bool) -> str:
+    """Hash a file with BLAKE3 over a memory map, optionally in multithreaded tree mode; the digest is unchanged."""
+    hasher = blake3.blake3(max_threads=blake3.blake3.AUTO) if parallel else blake3.blake3()
+    try:
+        hasher.update_mmap(path)
+    except OSError:
+        # As for SHA256, files that cannot be mapped are read in chunks; a file that cannot
+        # be opened at all fails again there with its own error
+        return _blake3_file(path)
+    # blake3 maps the file itself, but the advice reaches its cached pages through any descriptor
+    _release_path_pages(path)
+    digest: str = hasher.hexdigest()
+    return digest
+
+
+def _sha256_file(path: str, sequential: bool = True) -> str:
+    """Hash a file with hashlib's SHA256, which uses the CPU's SHA extensions where present."""
+    hasher = hashlib.sha256()
+    for chunk in _read_chunks(path, sequential):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _sha256_file_mmap(path: str) -> str:
+    """Hash a file with SHA256 over a memory map, in one update call that releases the GIL."""
+    with open(path, "rb") as f:
+        # A file emptied since it was sized cannot be mapped, but its digest is still well defined
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.sha256().hexdigest()
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError:
+            # Some filesystems, such as certain FUSE and network mounts, cannot map files
+            return _sha256_file(path)
+        with mapped:
+            if hasattr(mapped, "madvise"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            digest = hashlib.sha256(mapped).hexdigest()
+        _release_pages(f.fileno())
+        return digest
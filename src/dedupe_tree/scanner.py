@@ -1,74 +1,239 @@
 """File scanning and checksum calculation."""
 
-import subprocess
+import os
+import threading
+from array import array
+from collections import Counter, defaultdict
+from collections.abc import Collection
+from concurrent.futures import Executor, ThreadPoolExecutor
+from itertools import compress
+from operator import attrgetter
 from pathlib import Path
 
 from .cache import ChecksumCache
+from .hashing import DEFAULT_HASH_ALGORITHM, HEAD_SIZE, hash_file, hash_head
+
+# Directory descriptors the descriptor walk holds open at once, well under the usual 1024 limit
+_MAX_OPEN_DIRECTORIES = 256
 
 
 class FileInfo:
     """Information about a file including its checksum and depth."""
 
-    def __init__(self, path: Path, cache: ChecksumCache | None = None) -> None:
-        self.path = path
-        stat = path.stat()
-        self.size = stat.st_size
-        self.modification_time = stat.st_mtime
-        self.depth = len(path.parts) - 1  # Subtract 1 for root
+    # Slots keep the per-file footprint small and attribute access fast on large scans
+    __slots__ = ("_path", "_path_str", "size", "modification_time", "depth", "_checksum", "_cache")
+
+    def __init__(self, path: str | Path, cache: ChecksumCache | None = None, stat_result: os.stat_result | None = None) -> None:
+        """
+        Record a file's size, modification time and depth from a single stat.
+
+        Args:
+            path: Path to the file
+            cache: Checksum cache consulted and filled by the checksum property
+            stat_result: The file's stat, if already known. Scanners pass DirEntry.stat(), which
+                the entry caches, so a scanned file costs no stat call here. If None, the file is
+                stat'ed once; nothing is re-read from disk later.
+        """
+        # The scan hands over plain strings; the Path is only built when something asks for it
+        self._path = path if isinstance(path, Path) else None
+        self._path_str = os.fspath(path)
+        if stat_result is None:
+            stat_result = path.stat() if isinstance(path, Path) else os.stat(path)
+        self.size = stat_result.st_size
+        self.modification_time = stat_result.st_mtime
+        self.depth = self._path_str.count(os.sep)  # Separators past the root, as len(parts) - 1 without splitting
         self._checksum: str | None = None
         self._cache = cache
 
+    @property
+    def path(self) -> Path:
+        """The file's path, created on first access."""
+        if self._path is None:
+            self._path = Path(self._path_str)
+        return self._path
+
+    @property
+    def path_str(self) -> str:
+        """The file's path as a string, for sorting, keys and display without creating a Path."""
+        return self._path_str
+
     @property
     def checksum(self) -> str:
-        """Calculate SHA256 checksum lazily, using cache if available."""
+        """Calculate the file checksum lazily, using cache if available."""
         if self._checksum is None:
             # Try to get from cache first
             if self._cache:
-                cached_checksum = self._cache.get_checksum(self.path, self.size, self.modification_time)
+                cached_checksum = self._cache.get_checksum(self._path_str, self.size, self.modification_time)
                 if cached_checksum:
-                    self._checksum = cached_checksum
+                    self._checksum = cached_checksum.hex()
                     return self._checksum
 
-            # Calculate and cache the checksum
-            self._checksum = self._calculate_checksum()
-
-            # Store in cache if available and calculation was successful
-            if self._cache and self._checksum:
-                self._cache.store_checksum(self.path, self.size, self.modification_time, self._checksum)
+            self._checksum = self._compute_checksum()
 
         return self._checksum
 
+    def _compute_checksum(self) -> str:
+        """Calculate the file checksum and store it in the cache, without consulting the cache first."""
+        checksum = self._calculate_checksum()
+
+        # Store in cache if available and calculation was successful
+        if self._cache and checksum:
+            self._cache.store_checksum(self._path_str, self.size, self.modification_time, bytes.fromhex(checksum))
+
+        return checksum
+
     def _calculate_checksum(self) -> str:
-        """Calculate SHA256 checksum of the file using sha256sum."""
-        try:
-            result = subprocess.run(["sha256sum", str(self.path)], capture_output=True, text=True, check=True)
-            # sha256sum output format: "checksum  filename"
-            checksum = result.stdout.split()[0]
-            return checksum
-        except (subprocess.CalledProcessError, FileNotFoundError, IndexError) as e:
-            # Fall back to a descriptive error that will be caught by the caller
-            raise OSError(f"Failed to calculate checksum for {self.path}: {e}") from e
+        """Calculate the file checksum with the cache's hash algorithm."""
+        algorithm = self._cache.algorithm if self._cache else DEFAULT_HASH_ALGORITHM
+        return hash_file(self._path_str, algorithm, self.size)
 
     def __repr__(self) -> str:
-        return f"FileInfo(path={self.path}, size={self.size}, depth={self.depth})"
+        return f"FileInfo(path={self._path_str}, size={self.size}, depth={self.depth})"
+
+
+def _suffix_tuple(extensions: Collection[str] | None) -> tuple[str, ...] | None:
+    """Return extensions lowercased, as file names are before matching, in a tuple for str.endswith, or None when not filtering."""
+    if not extensions:
+        return None
+    return tuple(extension.lower() for extension in extensions)
+
+
+def _resolve_checksum(file_info: FileInfo) -> str | OSError:
+    """
+    Return the file's checksum, or the error raised while computing it.
+
+    The cache must already have been consulted for this file, as checksum_candidates
+    does in one query, so a missing checksum is computed without a second lookup.
+    """
+    if file_info._checksum is None:
+        try:
+            file_info._checksum = file_info._compute_checksum()
+        except OSError as e:
+            return e
+    return file_info._checksum
+
+
+def _resolve_head(file_info: FileInfo, algorithm: str) -> str | OSError:
+    """Return the checksum of the file's first HEAD_SIZE bytes, or the error raised while reading them."""
+    try:
+        return hash_head(file_info._path_str, algorithm)
+    except OSError as e:
+        return e
+
+
+def checksum_candidates(
+    cache: ChecksumCache, pool: Executor, size_groups: list[list[FileInfo]], errors: list[tuple[Path, Exception]]
+) -> list[tuple[FileInfo, str]]:
+    """
+    Checksum the files in groups of equal size that may still turn out to be duplicates.
+
+    Cached checksums are loaded in one query, skipping files that already carry one.
+    In the remaining groups of files larger than HEAD_SIZE, files whose leading bytes
+    match no other file of the same size are dropped before their full contents are
+    read, and only files still missing a checksum are read on pool. Files that fail
+    are recorded in errors.
+
+    Args:
+        cache: Checksum cache the files were created with
+        pool: Executor the file reads run on
+        size_groups: Groups of two or more files sharing a size
+        errors: List that (path, error) pairs are appended to
+
+    Returns:
+        (file, checksum) pairs for the files that were not ruled out
+    """
+    # Resolve cached checksums in one query instead of one lookup per file
+    unresolved = [f for group in size_groups for f in group if f._checksum is None]
+    cached = cache.get_checksum_many((f._path_str, f.size, f.modification_time) for f in unresolved)
+    for file_info in unresolved:
+        cached_checksum = cached.get(file_info._path_str)
+        if cached_checksum:
+            file_info._checksum = cached_checksum.hex()
+
+    candidates = _filter_by_head(cache.algorithm, pool, size_groups, errors)
+    # Known checksums are taken as they are; only the misses become tasks on the pool
+    results: list[tuple[FileInfo, str]] = [(f, f._checksum) for f in candidates if f._checksum is not None]
+    misses = [f for f in candidates if f._checksum is None]
+    # The largest files are started first, so no worker is left reading one big file after the
+    # rest have finished; results are still collected in scan order
+    futures = {file_info: pool.submit(_resolve_checksum, file_info) for file_info in sorted(misses, key=attrgetter("size"), reverse=True)}
+    for file_info in misses:
+        result = futures[file_info].result()
+        if isinstance(result, OSError):
+            errors.append((file_info.path, result))
+        else:
+            results.append((file_info, result))
+    return results
+
+
+def _filter_by_head(algorithm: str, pool: Executor, size_groups: list[list[FileInfo]], errors: list[tuple[Path, Exception]]) -> list[FileInfo]:
+    """
+    Drop files whose leading bytes match no other file of the same size.
+
+    Groups of small files, where the head is the whole file, and groups whose
+    checksums all came from the cache are passed through untouched.
+
+    Returns:
+        Files that still need their full checksum compared
+    """
+    survivors: list[FileInfo] = []
+    to_check: list[FileInfo] = []
+    for group in size_groups:
+        if group[0].size <= HEAD_SIZE or all(f._checksum is not None for f in group):
+            survivors.extend(group)
+        else:
+            to_check.extend(group)
+
+    head_groups: defaultdict[tuple[int, str], list[FileInfo]] = defaultdict(list)
+    for file_info, result in zip(to_check, pool.map(lambda f: _resolve_head(f, algorithm), to_check), strict=True):
+        if isinstance(result, OSError):
+            errors.append((file_info.path, result))
+            continue
+        head_groups[(file_info.size, result)].append(file_info)
+
+    survivors.extend(file_info for group in head_groups.values() if len(group) > 1 for file_info in group)
+    return survivors
 
 
 class FileScanner:
     """Scans directories and builds file information with checksums."""
 
-    def __init__(self, cache: ChecksumCache | None = None) -> None:
+    def __init__(self, cache: ChecksumCache | None = None, max_workers: int | None = None) -> None:
+        """
+        Initialize scanner.
+
+        Args:
+            cache: Checksum cache to use. If None, opens the default cache.
+            max_workers: Number of threads hashing files concurrently. If None, uses the ThreadPoolExecutor default.
+        """
+        self.max_workers = max_workers
         self.scanned_files: list[FileInfo] = []
+        # File sizes kept in a parallel C array so totals are summed without touching FileInfo objects
+        self.sizes = array("q")
+        # Running sum of sizes, so reports need not add them up again
+        self.total_bytes = 0
         self.errors: list[tuple[Path, Exception]] = []
+        # Files passed over by scan_directory's min_size filter
+        self.skipped_small = 0
         self._cache = cache or ChecksumCache()
+        # (device, inode) of files with several hard links, so only the first link found is recorded
+        self._inodes: set[tuple[int, int]] = set()
+        # Guards the parallel lists and counters, as DirectoryScanner records files from several threads
+        self._lock = threading.Lock()
 
-    def scan_directory(self, root_path: Path, extensions: set[str] | None = None) -> None:
+    def scan_directory(self, root_path: Path, extensions: Collection[str] | None = None, min_size: int = 0) -> None:
         """
         Recursively scan directory for files.
 
+        Symbolic links are skipped, whether to files or directories: links left by an
+        earlier --delete run would otherwise be matched against their own targets. Only
+        the first hard link found to a file is recorded, as its other links share its data.
+
         Args:
             root_path: Directory to scan
             extensions: Optional set of file extensions to include
                 (e.g., {'.txt', '.py'})
+            min_size: Skip files smaller than this many bytes, counting them in skipped_small
         """
         if not root_path.exists():
             raise FileNotFoundError(f"Directory not found: {root_path}")
@@ -76,36 +241,177 @@ class FileScanner:
         if not root_path.is_dir():
             raise NotADirectoryError(f"Path is not a directory: {root_path}")
 
-        for path in root_path.rglob("*"):
-            if path.is_file():
-                try:
-                    # Skip if extensions filter is specified and file doesn't match
-                    if extensions and path.suffix.lower() not in extensions:
+        suffixes = _suffix_tuple(extensions)
+        if os.scandir in os.supports_fd:
+            self._walk_fd(str(root_path), suffixes, min_size)
+        else:
+            self._walk_paths(str(root_path), suffixes, min_size)
+
+    def _walk_fd(self, root: str, suffixes: tuple[str, ...] | None, min_size: int) -> None:
+        """
+        Walk a directory through file descriptors, so each stat is a dir-relative fstatat.
+
+        Subdirectories are opened relative to their parent's descriptor rather than
+        by full path, sparing the kernel a path lookup from the root for every entry.
+        The walk keeps an explicit stack, so deep trees cannot exhaust the recursion
+        limit, and a directory's descriptor is closed once its subdirectories are open.
+        At most _MAX_OPEN_DIRECTORIES are held; beyond that, subdirectories wait on
+        the stack by path and are opened from it when their turn comes.
+        """
+        # O_NOFOLLOW: like Path.rglob, symlinked directories are not descended into
+        flags = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW
+        # (descriptor, path) of directories left to list; a descriptor of None is opened by path
+        stack: list[tuple[int | None, str]] = [(None, root)]
+        try:
+            while stack:
+                fd, directory = stack.pop()
+                if fd is None:
+                    try:
+                        fd = os.open(directory, flags)
+                    except OSError as e:
+                        self.errors.append((Path(directory), e))
                         continue
 
-                    file_info = FileInfo(path, self._cache)
-                    self.scanned_files.append(file_info)
+                try:
+                    subdirectories = []
+                    with os.scandir(fd) as entries:
+                        for entry in entries:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirectories.append(entry.name)
+                            elif entry.is_file(follow_symlinks=False):
+                                # Entries listed from a descriptor carry only their name as path
+                                self._add_file(entry, os.path.join(directory, entry.name), suffixes, min_size)
+                    for subdirectory in subdirectories:
+                        path = os.path.join(directory, subdirectory)
+                        if len(stack) >= _MAX_OPEN_DIRECTORIES:
+                            stack.append((None, path))
+                            continue
+                        try:
+                            stack.append((os.open(subdirectory, flags, dir_fd=fd), path))
+                        except OSError as e:
+                            self.errors.append((Path(path), e))
+                except OSError as e:
+                    self.errors.append((Path(directory), e))
+                finally:
+                    os.close(fd)
+        finally:
+            # Only reached with entries left if the walk was interrupted
+            for fd, _ in stack:
+                if fd is not None:
+                    os.close(fd)
 
-                except (OSError, PermissionError) as e:
-                    self.errors.append((path, e))
+    def _walk_paths(self, root: str, suffixes: tuple[str, ...] | None, min_size: int) -> None:
+        """Walk a directory by path, for platforms where os.scandir cannot take a descriptor."""
+        # DirEntry answers file/directory checks from the directory listing and caches
+        # its stat, so each kept file costs a single stat call
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        # Like Path.rglob, symlinked directories are not descended into
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            self._add_file(entry, entry.path, suffixes, min_size)
+            except OSError as e:
+                self.errors.append((Path(directory), e))
+
+    def add_entry(self, entry: os.DirEntry[str], extensions: Collection[str] | None = None, min_size: int = 0) -> FileInfo | None:
+        """
+        Record a file found by another directory walk unless the extension or size filters exclude it.
+
+        Args:
+            entry: Directory entry for a regular file
+            extensions: Optional file extensions to include. A tuple is used as is, saving a conversion
+                per call, so its extensions must already be lowercase; other collections are lowercased.
+            min_size: Skip files smaller than this many bytes, counting them in skipped_small
+
+        Returns:
+            The recorded FileInfo, or None if the file was filtered out
+        """
+        suffixes = extensions if isinstance(extensions, tuple) else _suffix_tuple(extensions)
+        return self._add_file(entry, entry.path, suffixes, min_size)
+
+    def _add_file(self, entry: os.DirEntry[str], path: str, suffixes: tuple[str, ...] | None, min_size: int) -> FileInfo | None:
+        """Record the file at path, listed as entry, unless the extension or size filters exclude it."""
+        # Skip if extensions filter is specified and file doesn't match; endswith checks every suffix in one call
+        if suffixes and not entry.name.lower().endswith(suffixes):
+            return None
+
+        try:
+            stat_result = entry.stat()
+        except OSError:
+            # A file that vanished or cannot be stat'ed is skipped, as Path.is_file() would
+            return None
+
+        # Small files are filtered here so they are never materialized
+        if stat_result.st_size < min_size:
+            with self._lock:
+                self.skipped_small += 1
+            return None
+
+        # Other links to an inode already recorded are the same data, not duplicates of it.
+        # DirEntry.stat() reports no link count on Windows, where every file is recorded.
+        if stat_result.st_nlink > 1:
+            inode = (stat_result.st_dev, stat_result.st_ino)
+            with self._lock:
+                if inode in self._inodes:
+                    return None
+                self._inodes.add(inode)
+
+        file_info = FileInfo(path, self._cache, stat_result)
+        with self._lock:
+            self.scanned_files.append(file_info)
+            self.sizes.append(file_info.size)
+            self.total_bytes += file_info.size
+        return file_info
+
+    def apply_min_size(self, min_size: int) -> int:
+        """
+        Drop scanned files smaller than min_size.
+
+        Returns:
+            Number of files removed
+        """
+        original_count = len(self.scanned_files)
+        keep = [size >= min_size for size in self.sizes]
+        self.scanned_files = list(compress(self.scanned_files, keep))
+        self.sizes = array("q", compress(self.sizes, keep))
+        self.total_bytes = sum(self.sizes)
+        return original_count - len(self.scanned_files)
 
     def get_duplicates(self) -> dict[str, list[FileInfo]]:
         """
         Group files by checksum to identify duplicates.
 
+        Only files sharing their size with another file are hashed, and large
+        files are fully read only if their first HEAD_SIZE bytes match another's.
+
         Returns:
             Dictionary mapping checksums to lists of files with that checksum
         """
-        checksum_groups: dict[str, list[FileInfo]] = {}
+        checksum_groups: defaultdict[str, list[FileInfo]] = defaultdict(list)
 
-        for file_info in self.scanned_files:
-            try:
-                checksum = file_info.checksum
-                if checksum not in checksum_groups:
-                    checksum_groups[checksum] = []
+        # A file with a unique size cannot have a duplicate, so it is never read. Sizes are
+        # counted from the C array first, so the usual majority of unique files never get a bucket.
+        size_counts = Counter(self.sizes)
+        size_groups: defaultdict[int, list[FileInfo]] = defaultdict(list)
+        for size, file_info in zip(self.sizes, self.scanned_files, strict=True):
+            if size_counts[size] > 1:
+                size_groups[size].append(file_info)
+        candidate_groups = list(size_groups.values())
+
+        self._cache.begin()
+        # Hashing releases the GIL (hashlib and blake3 both hash outside it), so threads
+        # overlap file reads while the cache's writer thread batches the results
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for file_info, checksum in checksum_candidates(self._cache, pool, candidate_groups, self.errors):
                 checksum_groups[checksum].append(file_info)
-            except (OSError, PermissionError) as e:
-                self.errors.append((file_info.path, e))
+
+        # Commit checksums computed during this pass in one batch
+        self._cache.commit_batch()
 
         # Return only groups with duplicates (more than 1 file)
         return {k: v for k, v in checksum_groups.items() if len(v) > 1}
@@ -113,7 +419,11 @@ class FileScanner:
     def clear(self) -> None:
         """Clear scanned files and errors."""
         self.scanned_files.clear()
+        self.sizes = array("q")
+        self.total_bytes = 0
         self.errors.clear()
+        self.skipped_small = 0
+        self._inodes.clear()
 
     def cleanup_cache(self, max_age_days: int = 30) -> int:
         """Clean up stale cache entries."""
@@ -129,9 +439,10 @@ class FileScanner:
             self._cache.close()
 
     def __enter__(self) -> "FileScanner":
-        """Context manager entry."""
+        """Context manager entry, entering the cache as well."""
+        self._cache.__enter__()
         return self
 
     def __exit__(self, exc_type: type[BaseException] | None, exc_val: BaseException | None, exc_tb: object) -> None:
-        """Context manager exit."""
-        self.close()
+        """Context manager exit; a cache shared with an enclosing with block stays open."""
+        self._cache.__exit__(exc_type, exc_val, exc_tb)
@@ -1,10 +1,15 @@
 """Tests for cache functionality."""
 
+import os
+import sqlite3
 import tempfile
 import time
 from pathlib import Path
 
-from dedupe_tree.cache import ChecksumCache
+import pytest
+
+from dedupe_tree.cache import _EVICT_SQL, _GET_SQL, _PRUNE_DIRS_SQL, _TOUCH_INTERVAL, ChecksumCache
+from dedupe_tree.hashing import HASH_ALGORITHMS, hash_file, is_available
 from dedupe_tree.scanner import FileInfo
 
 
@@ -15,10 +20,10 @@ def test_cache_basic_operations():
         cache = ChecksumCache(cache_path)
 
         # Test storing and retrieving
-        file_path = Path("/test/file.txt")
+        file_path = "/test/file.txt"
         file_size = 1024
         mod_time = time.time()
-        checksum = "abc123"
+        checksum = bytes.fromhex("abc123")
 
         cache.store_checksum(file_path, file_size, mod_time, checksum)
         retrieved = cache.get_checksum(file_path, file_size, mod_time)
@@ -26,7 +31,7 @@ def test_cache_basic_operations():
         assert retrieved == checksum
 
         # Test cache miss for different file
-        miss = cache.get_checksum(Path("/other/file.txt"), file_size, mod_time)
+        miss = cache.get_checksum("/other/file.txt", file_size, mod_time)
         assert miss is None
 
         # Test cache miss for different size
@@ -40,8 +45,9 @@ def test_cache_basic_operations():
         cache.close()
 
 
-def test_cache_with_file_info():
-    """Test cache integration with FileInfo."""
+@pytest.mark.parametrize("algorithm", [a for a in HASH_ALGORITHMS if is_available(a)])
+def test_cache_with_file_info(algorithm):
+    """Test cache integration with FileInfo for each installed algorithm."""
     with tempfile.TemporaryDirectory() as tmpdir:
         tmp_path = Path(tmpdir)
         cache_path = tmp_path / "test_cache.db"
@@ -51,12 +57,13 @@ def test_cache_with_file_info():
         test_file.write_text("hello world")
 
         # Create cache and FileInfo
-        cache = ChecksumCache(cache_path)
+        cache = ChecksumCache(cache_path, algorithm)
         file_info = FileInfo(test_file, cache)
 
-        # First access should calculate and cache
+        # First access should calculate and cache; both algorithms give 256-bit hex digests
         checksum1 = file_info.checksum
-        assert len(checksum1) == 64  # SHA256 length
+        assert checksum1 == hash_file(str(test_file), algorithm)
+        assert len(checksum1) == 64
 
         # Create another FileInfo for same file
         file_info2 = FileInfo(test_file, cache)
@@ -66,8 +73,8 @@ def test_cache_with_file_info():
         assert checksum1 == checksum2
 
         # Verify it's actually in cache
-        cached = cache.get_checksum(test_file, file_info.size, file_info.modification_time)
-        assert cached == checksum1
+        cached = cache.get_checksum(str(test_file), file_info.size, file_info.modification_time)
+        assert cached is not None and cached.hex() == checksum1
 
         cache.close()
 
@@ -86,9 +93,10 @@ def test_cache_invalidation():
         file_info1 = FileInfo(test_file, cache)
         checksum1 = file_info1.checksum
 
-        # Modify file (this will change modification time)
-        time.sleep(0.1)  # Ensure different modification time
+        # Modify file, stamping a later modification time instead of sleeping past the clock's resolution
         test_file.write_text("modified content")
+        mtime = file_info1.modification_time + 1
+        os.utime(test_file, (mtime, mtime))
 
         # Create new FileInfo for modified file
         file_info2 = FileInfo(test_file, cache)
@@ -112,9 +120,9 @@ def test_cache_stats():
         assert stats["unique_checksums"] == 0
 
         # Add some entries
-        cache.store_checksum(Path("/file1.txt"), 100, time.time(), "checksum1")
-        cache.store_checksum(Path("/file2.txt"), 200, time.time(), "checksum2")
-        cache.store_checksum(Path("/file3.txt"), 300, time.time(), "checksum1")  # Duplicate checksum
+        cache.store_checksum("/file1.txt", 100, time.time(), b"checksum1")
+        cache.store_checksum("/file2.txt", 200, time.time(), b"checksum2")
+        cache.store_checksum("/file3.txt", 300, time.time(), b"checksum1")  # Duplicate checksum
 
         stats = cache.get_cache_stats()
         assert stats["total_entries"] == 3
@@ -124,38 +132,379 @@ def test_cache_stats():
 
 
 def test_cache_cleanup():
-    """Test cache cleanup of old entries."""
+    """Test cache cleanup of entries not used by recent scans."""
     with tempfile.TemporaryDirectory() as tmpdir:
         cache_path = Path(tmpdir) / "test_cache.db"
-        cache = ChecksumCache(cache_path)
-
-        # Add old and new entries
         old_time = time.time() - (35 * 24 * 60 * 60)  # 35 days ago
-        new_time = time.time()
 
-        cache.store_checksum(Path("/old_file.txt"), 100, old_time, "old_checksum")
-        cache.store_checksum(Path("/new_file.txt"), 200, new_time, "new_checksum")
+        # Entries written by a scan 35 days ago
+        cache = ChecksumCache(cache_path)
+        cache._session_time = old_time
+        cache.store_checksum("/unused_file.txt", 100, old_time, b"unused_checksum")
+        cache.store_checksum("/reused_file.txt", 200, old_time, b"reused_checksum")
+        cache.close()
+
+        # A recent scan looks up one of them, even though the file itself is old
+        cache = ChecksumCache(cache_path)
+        assert cache.get_checksum("/reused_file.txt", 200, old_time) == b"reused_checksum"
 
-        # Cleanup entries older than 30 days
+        # Cleanup entries not accessed in 30 days
         removed = cache.cleanup_stale_entries(30)
         assert removed == 1
 
-        # Only new entry should remain
+        # Only the recently used entry should remain
         stats = cache.get_cache_stats()
         assert stats["total_entries"] == 1
+        assert cache.get_checksum("/reused_file.txt", 200, old_time) == b"reused_checksum"
 
         cache.close()
 
 
+def test_cache_cleanup_allows_one_day_of_slack():
+    """Test that cleanup keeps entries up to a day past max_age_days, except that 0 removes everything."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with ChecksumCache(Path(tmpdir) / "test_cache.db") as cache:
+            day = 24 * 60 * 60
+            for path, age in (("/within_slack.txt", 30.5 * day), ("/past_slack.txt", 31.5 * day), ("/recent.txt", 0.5 * day)):
+                cache._session_time = time.time() - age
+                cache.store_checksum(path, 1, 1.0, path.encode())
+                cache.flush()
+
+            assert cache.cleanup_stale_entries(30) == 1
+            assert cache.get_checksum("/within_slack.txt", 1, 1.0) == b"/within_slack.txt"
+            assert cache.cleanup_stale_entries(0) == 2
+            assert cache.get_cache_stats()["total_entries"] == 0
+
+
+def test_cache_touches_only_rows_not_used_recently():
+    """Test that lookups rewrite last_access only for rows not used within the touch interval."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache_path = Path(tmpdir) / "test_cache.db"
+        now = time.time()
+
+        with ChecksumCache(cache_path) as cache:
+            cache._session_time = now - 60
+            cache.store_checksum("/recent.txt", 1, 1.0, b"recent")
+            cache.flush()
+            cache._session_time = now - 2 * _TOUCH_INTERVAL
+            cache.store_checksum("/old.txt", 1, 1.0, b"old")
+
+        with ChecksumCache(cache_path) as cache:
+            assert cache.get_checksum_many([("/recent.txt", 1, 1.0), ("/old.txt", 1, 1.0)]) == {"/recent.txt": b"recent", "/old.txt": b"old"}
+            cache.flush()
+            rows = dict(cache._writer_conn().execute("SELECT name, last_access FROM file_cache"))
+
+        assert rows["recent.txt"] == now - 60
+        assert rows["old.txt"] == cache._session_time
+
+
 def test_cache_context_manager():
     """Test cache as context manager."""
     with tempfile.TemporaryDirectory() as tmpdir:
         cache_path = Path(tmpdir) / "test_cache.db"
 
         with ChecksumCache(cache_path) as cache:
-            cache.store_checksum(Path("/test.txt"), 100, time.time(), "checksum")
+            cache.store_checksum("/test.txt", 100, time.time(), b"checksum")
             assert cache.get_cache_stats()["total_entries"] == 1
 
         # Cache should be closed now, but data should persist
         with ChecksumCache(cache_path) as cache2:
             assert cache2.get_cache_stats()["total_entries"] == 1
+
+            # A nested with block shares the open cache rather than closing it on exit
+            with cache2:
+                assert cache2.get_cache_stats()["total_entries"] == 1
+            assert cache2._connection is not None
+
+        assert cache2._connection is None
+
+
+def test_cache_batched_writes():
+    """Test that buffered writes are visible before flush and persisted after close."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache_path = Path(tmpdir) / "test_cache.db"
+        mod_time = time.time()
+
+        with ChecksumCache(cache_path) as cache:
+            cache.store_checksum("/pending.txt", 100, mod_time, b"pending")
+            # Pending write is served before it is committed
+            assert cache.get_checksum("/pending.txt", 100, mod_time) == b"pending"
+            assert cache.get_checksum("/pending.txt", 200, mod_time) is None
+
+            cache.store_checksums_bulk([(f"/bulk{i}.txt", i, mod_time, f"checksum{i}".encode()) for i in range(10)])
+            assert cache.get_checksum("/bulk3.txt", 3, mod_time) == b"checksum3"
+
+        with ChecksumCache(cache_path) as cache2:
+            assert cache2.get_cache_stats()["total_entries"] == 11
+            assert cache2.get_checksum("/pending.txt", 100, mod_time) == b"pending"
+
+
+def test_cache_bulk_store_commits_queued_rows_together():
+    """Test that a bulk store and the rows queued before it share one transaction."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with ChecksumCache(Path(tmpdir) / "test_cache.db") as cache:
+            mod_time = time.time()
+            # Keep the background writer from committing the queued row on its own
+            cache._flush_interval = 3600
+            cache.store_checksum("/queued.txt", 1, mod_time, b"queued")
+
+            statements: list[str] = []
+            cache._writer_conn().set_trace_callback(statements.append)
+            cache.store_checksums_bulk([("/bulk.txt", 2, mod_time, b"bulk"), ("/queued.txt", 1, mod_time, b"replaced")])
+            cache._writer_conn().set_trace_callback(None)
+
+            assert statements.count("BEGIN IMMEDIATE") == 1
+            cache._hot.clear()
+            assert cache.get_checksum("/queued.txt", 1, mod_time) == b"replaced"
+            assert cache.get_checksum("/bulk.txt", 2, mod_time) == b"bulk"
+
+
+def test_cache_connection_pragmas():
+    """Test that the connection is tuned for bulk scans."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with ChecksumCache(Path(tmpdir) / "test_cache.db") as cache:
+            conn = cache._writer_conn()
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+            assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+            assert conn.execute("PRAGMA cache_size").fetchone()[0] == -65536
+            # Both sides wait out a locked database rather than failing at once
+            for connection in (conn, cache._reader_conn()):
+                assert connection.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+
+
+def test_cache_get_checksum_many():
+    """Test batched checksum lookups."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with ChecksumCache(Path(tmpdir) / "test_cache.db") as cache:
+            mod_time = time.time()
+            cache.store_checksums_bulk([("/a.txt", 1, mod_time, b"checksum_a"), ("/b.txt", 2, mod_time, b"checksum_b")])
+            cache.store_checksum("/c.txt", 3, mod_time, b"checksum_c")
+
+            found = cache.get_checksum_many(
+                [
+                    ("/a.txt", 1, mod_time),
+                    ("/b.txt", 99, mod_time),  # Size changed
+                    ("/c.txt", 3, mod_time),  # Still pending
+                    ("/missing.txt", 4, mod_time),
+                ]
+            )
+
+            assert found == {"/a.txt": b"checksum_a", "/c.txt": b"checksum_c"}
+            assert cache.get_checksum_many([]) == {}
+
+
+def test_cache_rebuilds_outdated_schema():
+    """Test that a cache created with an older table layout is rebuilt."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache_path = Path(tmpdir) / "test_cache.db"
+
+        conn = sqlite3.connect(cache_path)
+        conn.execute("CREATE TABLE file_cache (file_path TEXT PRIMARY KEY, file_size INTEGER, modification_time REAL, checksum TEXT)")
+        conn.executemany("INSERT INTO file_cache VALUES (?, 1, 1.0, 'old')", ((f"/old{i}.txt",) for i in range(2000)))
+        conn.commit()
+        conn.close()
+
+        with ChecksumCache(cache_path) as cache:
+            assert cache.get_cache_stats()["total_entries"] == 0
+            # The old layout's pages are returned rather than left on the freelist
+            assert cache._writer_conn().execute("PRAGMA freelist_count").fetchone()[0] == 0
+            cache.store_checksum("/new.txt", 1, 1.0, b"new")
+            assert cache.get_checksum("/new.txt", 1, 1.0) == b"new"
+
+
+def test_cache_explicit_batch_transaction():
+    """Test that begin()/commit_batch() group writes into one transaction."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache_path = Path(tmpdir) / "test_cache.db"
+        mod_time = time.time()
+
+        with ChecksumCache(cache_path) as cache:
+            cache._pending_threshold = 2
+            cache.begin()
+            for i in range(5):
+                cache.store_checksum(f"/file{i}.txt", i, mod_time, f"checksum{i}".encode())
+
+            # Flushed rows are written but not yet committed
+            assert cache._writer_conn().in_transaction
+            with ChecksumCache(cache_path) as reader:
+                assert reader.get_cache_stats()["total_entries"] == 0
+
+            cache.commit_batch()
+            assert not cache._writer_conn().in_transaction
+
+        with ChecksumCache(cache_path) as cache2:
+            assert cache2.get_cache_stats()["total_entries"] == 5
+
+
+def test_cache_background_writer_commits_queued_rows():
+    """Test that queued stores are committed by the writer thread without an explicit flush."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache_path = Path(tmpdir) / "test_cache.db"
+
+        with ChecksumCache(cache_path) as cache:
+            cache._flush_interval = 0.01
+            for i in range(3):
+                cache.store_checksum(f"/queued{i}.txt", i, 1.0, b"queued")
+
+            deadline = time.monotonic() + 5
+            count = 0
+            while count < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+                with sqlite3.connect(cache_path) as conn:
+                    count = conn.execute("SELECT COUNT(*) FROM file_cache").fetchone()[0]
+            assert count == 3
+            assert cache._writer is not None
+
+        assert cache._writer is None
+
+
+def test_cache_concurrent_readers():
+    """Test that lookups from worker threads use their own read connections."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with ChecksumCache(Path(tmpdir) / "test_cache.db") as cache:
+            mod_time = time.time()
+            cache.store_checksums_bulk([(f"/file{i}.txt", i, mod_time, f"checksum{i}".encode()) for i in range(50)])
+            cache._hot.clear()
+
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                results = list(executor.map(lambda i: cache.get_checksum(f"/file{i}.txt", i, mod_time), range(50)))
+
+            assert results == [f"checksum{i}".encode() for i in range(50)]
+            assert 1 <= len(cache._readers) <= 4
+
+
+def test_cache_hot_lookups_served_from_memory():
+    """Test that recent lookups are answered without querying SQLite."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with ChecksumCache(Path(tmpdir) / "test_cache.db") as cache:
+            mod_time = time.time()
+            cache.store_checksums_bulk([("/hot.txt", 1, mod_time, b"hot")])
+
+            # Remove the row behind the cache's back; the in-memory answer still wins
+            cache._writer_conn().execute("DELETE FROM file_cache")
+            assert cache.get_checksum("/hot.txt", 1, mod_time) == b"hot"
+            assert cache.get_checksum("/hot.txt", 2, mod_time) is None
+
+            cache.clear_cache()
+            assert cache.get_checksum("/hot.txt", 1, mod_time) is None
+
+
+def test_cache_interns_directory_paths():
+    """Test that files in the same directory share one interned directory row."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with ChecksumCache(Path(tmpdir) / "test_cache.db") as cache:
+            mod_time = time.time()
+            cache.store_checksums_bulk(
+                [
+                    ("/photos/2024/a.jpg", 1, mod_time, b"a"),
+                    ("/photos/2024/b.jpg", 2, mod_time, b"b"),
+                    ("/photos/2025/a.jpg", 3, mod_time, b"c"),
+                ]
+            )
+            cache._hot.clear()
+
+            conn = cache._writer_conn()
+            assert conn.execute("SELECT COUNT(*) FROM dirs").fetchone()[0] == 2
+            assert cache.get_checksum("/photos/2025/a.jpg", 3, mod_time) == b"c"
+            assert cache.get_checksum("/photos/2024/a.jpg", 3, mod_time) is None
+
+
+def test_cache_lookup_uses_covering_indexes():
+    """Test that checksum lookups never fall back to a table scan or second probe."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with ChecksumCache(Path(tmpdir) / "test_cache.db") as cache:
+            plan = [row[3] for row in cache._writer_conn().execute("EXPLAIN QUERY PLAN " + _GET_SQL, ("/dir", "file", "sha256", 1, 1.0))]
+
+            assert any("dirs USING COVERING INDEX" in step for step in plan)
+            assert any("file_cache USING PRIMARY KEY" in step for step in plan)
+            assert not any(step.startswith("SCAN") for step in plan)
+
+
+def test_cache_cleanup_uses_indexes():
+    """Test that eviction seeks stale rows by access time and probes each directory by key."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with ChecksumCache(Path(tmpdir) / "test_cache.db") as cache:
+            conn = cache._writer_conn()
+            evict_plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + _EVICT_SQL, (1.0,))]
+            prune_plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + _PRUNE_DIRS_SQL)]
+
+            assert any("idx_last_access" in step for step in evict_plan)
+            assert not any(step.startswith("SCAN file_cache") for step in prune_plan)
+
+
+def test_cache_unique_checksum_refcounts():
+    """Test that checksum_refs tracks unique checksums through inserts, updates and deletes."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with ChecksumCache(Path(tmpdir) / "test_cache.db") as cache:
+            cache.store_checksums_bulk([("/a.txt", 1, 1.0, b"same"), ("/b.txt", 1, 1.0, b"same"), ("/c.txt", 2, 1.0, b"other")])
+            assert cache.get_cache_stats() == {"total_entries": 3, "unique_checksums": 2}
+
+            # Rewriting a file moves its reference to the new checksum
+            cache.store_checksums_bulk([("/c.txt", 3, 2.0, b"same")])
+            assert cache.get_cache_stats() == {"total_entries": 3, "unique_checksums": 1}
+            refs = cache._writer_conn().execute("SELECT checksum, refcount FROM checksum_refs").fetchall()
+            assert refs == [(b"same", 3)]
+
+            cache._session_time = time.time() - 40 * 24 * 60 * 60
+            cache.store_checksums_bulk([("/d.txt", 4, 1.0, b"stale")])
+            assert cache.get_cache_stats()["unique_checksums"] == 2
+            assert cache.cleanup_stale_entries(max_age_days=30) == 1
+            assert cache.get_cache_stats() == {"total_entries": 3, "unique_checksums": 1}
+
+
+def test_cache_clear_rebuilds_tables_and_truncates_wal():
+    """Test that clear_cache empties every table, shrinks the WAL and leaves the cache usable."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache_path = Path(tmpdir) / "test_cache.db"
+        with ChecksumCache(cache_path) as cache:
+            cache.store_checksums_bulk([(f"/dir{i}/file.txt", i, 1.0, f"checksum{i}".encode()) for i in range(100)])
+            assert cache.get_checksum("/dir5/file.txt", 5, 1.0) == b"checksum5"
+
+            cache.clear_cache()
+            assert cache.get_cache_stats() == {"total_entries": 0, "unique_checksums": 0}
+            assert Path(f"{cache_path}-wal").stat().st_size == 0
+            assert cache.get_checksum("/dir5/file.txt", 5, 1.0) is None
+
+            cache.store_checksums_bulk([("/dir5/file.txt", 5, 1.0, b"again")])
+            assert cache.get_checksum("/dir5/file.txt", 5, 1.0) == b"again"
+            assert cache.get_cache_stats() == {"total_entries": 1, "unique_checksums": 1}
+
+
+def test_cache_stats_fast_reads_analyze_statistics():
+    """Test that fast stats come from sqlite_stat1 and are refreshed on close."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache_path = Path(tmpdir) / "test_cache.db"
+        with ChecksumCache(cache_path) as cache:
+            assert cache.get_cache_stats_fast() == {"total_entries": 0, "unique_checksums": 0}
+
+            cache.store_checksums_bulk([(f"/file{i}.txt", i, 1.0, f"checksum{i % 5}".encode()) for i in range(10)])
+            # No statistics yet, so they are gathered on first use
+            assert cache.get_cache_stats_fast() == {"total_entries": 10, "unique_checksums": 5}
+
+            cache.store_checksums_bulk([(f"/more{i}.txt", i, 1.0, b"more") for i in range(5)])
+            # Statistics are stale until the next ANALYZE; exact=True always counts
+            assert cache.get_cache_stats_fast() == {"total_entries": 10, "unique_checksums": 5}
+            assert cache.get_cache_stats_fast(exact=True) == {"total_entries": 15, "unique_checksums": 6}
+
+        with ChecksumCache(cache_path) as cache:
+            assert cache.get_cache_stats_fast() == {"total_entries": 15, "unique_checksums": 6}
+
+
+def test_cache_keeps_algorithms_apart():
+    """Test that checksums stored for one algorithm are not returned for another."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache_path = Path(tmpdir) / "test_cache.db"
+        with ChecksumCache(cache_path, algorithm="sha256") as cache:
+            cache.store_checksum("/file.txt", 1, 1.0, b"sha")
+
+        with ChecksumCache(cache_path, algorithm="blake3") as cache:
+            assert cache.get_checksum("/file.txt", 1, 1.0) is None
+            assert cache.get_checksum_many([("/file.txt", 1, 1.0)]) == {}
+            cache.store_checksum("/file.txt", 1, 1.0, b"b3")
+
+        with ChecksumCache(cache_path, algorithm="sha256") as cache:
+            assert cache.get_checksum("/file.txt", 1, 1.0) == b"sha"
+            assert cache.get_cache_stats()["total_entries"] == 2
@@ -1,16 +1,28 @@
 """Tests for CLI functionality."""
 
+import subprocess
+import sys
 import tempfile
 from pathlib import Path
 
+import pytest
 from click.testing import CliRunner
 
+import dedupe_tree.cli as cli_module
+from dedupe_tree.cache import ChecksumCache
 from dedupe_tree.cli import main
 from dedupe_tree.deduplicator import DeduplicationResult, DuplicateGroup
+from dedupe_tree.hashing import is_available
 from dedupe_tree.scanner import FileInfo
 
 
-def test_log_file_functionality():
+@pytest.fixture(scope="module")
+def runner() -> CliRunner:
+    """Share one CliRunner across the module; each invoke() isolates its own streams."""
+    return CliRunner()
+
+
+def test_log_file_functionality(runner):
     """Test that log file functionality works correctly with detailed reports."""
     with tempfile.TemporaryDirectory() as tmpdir:
         tmp_path = Path(tmpdir)
@@ -24,7 +36,6 @@ def test_log_file_functionality():
         file1.write_text(content)
         file2.write_text(content)
 
-        runner = CliRunner()
         result = runner.invoke(main, [str(tmp_path), "--log-file", str(log_file)])
 
         # Should complete successfully
@@ -40,6 +51,13 @@ def test_log_file_functionality():
         assert "File Group 1:" in log_content
         assert str(file1) in log_content or str(file2) in log_content
 
+        # Rendered at the fixed log width, with no progress spinner frames
+        lines = log_content.splitlines()
+        assert len(lines[0]) == 120
+        assert all(len(line) <= 120 for line in lines)
+        assert "Analyzing file duplicates" not in log_content
+        assert "Found 2 files" not in log_content
+
 
 def test_show_detailed_report_with_log_file():
     """Test that show_detailed_report works correctly with log file output."""
@@ -81,9 +99,52 @@ def test_show_detailed_report_with_log_file():
         assert "File Group 1:" in log_content
 
 
-def test_cli_help():
+def test_show_detailed_report_prints_in_batches():
+    """Test that a large report is printed in bounded batches rather than one renderable."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        (tmp_path / "a.txt").write_text("content")
+        (tmp_path / "b.txt").write_text("content")
+        files = [FileInfo(tmp_path / name) for name in ("a.txt", "b.txt")]
+
+        groups = [DuplicateGroup(checksum=f"{i:064x}", keep_file=files[0], remove_files=[files[1]], total_size=14) for i in range(150)]
+        result = DeduplicationResult(
+            groups=groups, directory_groups=[], total_files_to_remove=150, total_directories_to_remove=0, total_space_to_free=1050, errors=[]
+        )
+
+        printed = []
+        cli_module.show_detailed_report(result, printed.append)
+
+        # The heading, then one Group per REPORT_BATCH_SIZE tables (each followed by a spacer)
+        assert len(printed) == 3
+        assert [len(group.renderables) for group in printed[1:]] == [2 * cli_module.REPORT_BATCH_SIZE, 2 * 50]
+
+        # A limit keeps the leading groups and reports how many were left out
+        printed = []
+        cli_module.show_detailed_report(result, printed.append, max_groups=10)
+        assert len(printed) == 3
+        assert len(printed[1].renderables) == 2 * 10
+        assert printed[2] == "[dim]140 more file groups and 0 more directory groups not shown[/dim]"
+
+
+def test_cli_max_groups_option(runner):
+    """Test that --max-groups limits the detailed report and reports how many groups were left out."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        for content in ("first", "second"):
+            (tmp_path / f"{content}_a.txt").write_text(content)
+            (tmp_path / f"{content}_b.txt").write_text(content)
+
+        result = runner.invoke(main, [str(tmp_path), "--max-groups", "1"])
+
+        assert result.exit_code == 0
+        assert "File Group 1:" in result.output
+        assert "File Group 2:" not in result.output
+        assert "1 more file groups and 0 more directory groups not shown" in result.output
+
+
+def test_cli_help(runner):
     """Test that CLI help works."""
-    runner = CliRunner()
     result = runner.invoke(main, ["--help"])
 
     assert result.exit_code == 0
@@ -95,9 +156,56 @@ def test_cli_help():
     assert "--min-size" in result.output
     assert "--min-files" in result.output
     assert "--log-file" in result.output
+    assert "--hash" in result.output
+    assert "--jobs" in result.output
+    assert "--hardlinks" in result.output
+    assert "--max-groups" in result.output
+
+
+def test_cli_import_defers_progress_and_table():
+    """Test that importing the CLI does not load the rich modules only needed once a scan runs."""
+    code = "import sys, dedupe_tree.cli; print('rich.progress' in sys.modules, 'rich.table' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.split() == ["False", "False"]
+
+
+def test_cli_hash_option(runner):
+    """Test that --hash selects the checksum algorithm and rejects missing ones."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        (tmp_path / "a.txt").write_text("same")
+        (tmp_path / "b.txt").write_text("same")
+
+        result = runner.invoke(main, [str(tmp_path), "--hash", "sha256"])
+        assert result.exit_code == 0
+        assert "Hash: sha256" in result.output
+        assert "File Group 1:" in result.output
 
+        result = runner.invoke(main, [str(tmp_path), "--hash", "md5"])
+        assert result.exit_code != 0
 
-def test_cli_with_extensions_filter():
+        if not is_available("blake3"):
+            result = runner.invoke(main, [str(tmp_path), "--hash", "blake3"])
+            assert result.exit_code != 0
+            assert "not installed" in result.output
+
+
+def test_cli_jobs_option(runner):
+    """Test that --jobs sizes the hashing pool and rejects non-positive counts."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        for i in range(6):
+            (tmp_path / f"file{i}.txt").write_text(f"content {i % 2}")
+
+        result = runner.invoke(main, [str(tmp_path), "--jobs", "1"])
+        assert result.exit_code == 0
+        assert "File Group 2:" in result.output
+
+        result = runner.invoke(main, [str(tmp_path), "--jobs", "0"])
+        assert result.exit_code != 0
+
+
+def test_cli_with_extensions_filter(runner):
     """Test CLI with extensions filter."""
     with tempfile.TemporaryDirectory() as tmpdir:
         tmp_path = Path(tmpdir)
@@ -112,7 +220,6 @@ def test_cli_with_extensions_filter():
         txt_file2.write_text(content)
         py_file.write_text(content)
 
-        runner = CliRunner()
         result = runner.invoke(main, [str(tmp_path), "--extensions", ".txt"])
 
         assert result.exit_code == 0
@@ -123,7 +230,23 @@ def test_cli_with_extensions_filter():
         assert str(py_file) not in result.output
 
 
-def test_cli_with_min_size_filter():
+def test_cli_extensions_filter_parsing(runner):
+    """Test that blank entries are ignored and undotted extensions are rejected."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        (tmp_path / "a.txt").write_text("same")
+        (tmp_path / "b.TXT").write_text("same")
+
+        result = runner.invoke(main, [str(tmp_path), "--extensions", " .TXT, ,"])
+        assert result.exit_code == 0
+        assert "File Group 1:" in result.output
+
+        result = runner.invoke(main, [str(tmp_path), "--extensions", ".txt,py"])
+        assert result.exit_code != 0
+        assert "py" in result.output
+
+
+def test_cli_with_min_size_filter(runner):
     """Test CLI with minimum size filter."""
     with tempfile.TemporaryDirectory() as tmpdir:
         tmp_path = Path(tmpdir)
@@ -142,7 +265,6 @@ def test_cli_with_min_size_filter():
         large_file1.write_text(large_content)
         large_file2.write_text(large_content)
 
-        runner = CliRunner()
         result = runner.invoke(main, [str(tmp_path), "--min-size", "1000"])  # Only large files should be considered
 
         assert result.exit_code == 0
@@ -155,16 +277,15 @@ def test_cli_with_min_size_filter():
             assert str(small_file2) not in result.output
 
 
-def test_cli_error_handling():
+def test_cli_error_handling(runner):
     """Test CLI error handling for invalid paths."""
-    runner = CliRunner()
     result = runner.invoke(main, ["/nonexistent/path"])
 
     # Should fail with non-zero exit code
     assert result.exit_code != 0
 
 
-def test_cli_symbolic_link_creation():
+def test_cli_symbolic_link_creation(runner):
     """Test that CLI creates symbolic links when --delete is used."""
     with tempfile.TemporaryDirectory() as tmpdir:
         tmp_path = Path(tmpdir)
@@ -181,7 +302,6 @@ def test_cli_symbolic_link_creation():
         assert file1.exists() and not file1.is_symlink()
         assert file2.exists() and not file2.is_symlink()
 
-        runner = CliRunner()
         # Use --delete flag and automatically confirm with 'y'
         result = runner.invoke(main, [str(tmp_path), "--delete"], input="y\n")
 
@@ -209,8 +329,37 @@ def test_cli_symbolic_link_creation():
         assert file1.read_text() == content
         assert file2.read_text() == content
 
+        # A second run does not match the new link against the file it points to
+        result = runner.invoke(main, [str(tmp_path), "--delete"], input="y\n")
+        assert result.exit_code == 0
+        assert "No duplicate files found" in result.output
+        assert file1.read_text() == content
+        assert file2.read_text() == content
+
+
+def test_cli_hard_link_creation(runner):
+    """Test that --hardlinks with --delete replaces duplicate files with hard links and says so."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        kept = tmp_path / "a.txt"
+        copy = tmp_path / "b.txt"
+        kept.write_text("duplicate content for hard link test")
+        copy.write_text("duplicate content for hard link test")
+
+        result = runner.invoke(main, [str(tmp_path), "--delete", "--hardlinks"], input="y\n")
+
+        assert result.exit_code == 0
+        assert "Really replace 1 files with hard links?" in result.output
+        assert "Replaced 1 duplicate files with hard links" in result.output
+        assert not copy.is_symlink()
+        assert copy.stat().st_ino == kept.stat().st_ino
+
+        # Further links to an inode already recorded are not reported as its duplicates
+        result = runner.invoke(main, [str(tmp_path), "--delete", "--hardlinks"], input="y\n")
+        assert "No duplicate files found" in result.output
+
 
-def test_cli_file_mode_default():
+def test_cli_file_mode_default(runner):
     """Test that CLI processes files by default (without --directories flag)."""
     with tempfile.TemporaryDirectory() as tmpdir:
         tmp_path = Path(tmpdir)
@@ -223,7 +372,6 @@ def test_cli_file_mode_default():
         file1.write_text(content)
         file2.write_text(content)
 
-        runner = CliRunner()
         result = runner.invoke(main, [str(tmp_path)])
 
         # Should complete successfully
@@ -234,7 +382,7 @@ def test_cli_file_mode_default():
         assert "Directory Analysis:" not in result.output
 
 
-def test_cli_directory_mode():
+def test_cli_directory_mode(runner):
     """Test that CLI processes directories when --directories flag is used."""
     with tempfile.TemporaryDirectory() as tmpdir:
         tmp_path = Path(tmpdir)
@@ -252,7 +400,6 @@ def test_cli_directory_mode():
         (dir2 / "file1.txt").write_text("content1")
         (dir2 / "file2.txt").write_text("content2")
 
-        runner = CliRunner()
         result = runner.invoke(main, [str(tmp_path), "--directories"])
 
         # Should complete successfully
@@ -263,7 +410,30 @@ def test_cli_directory_mode():
         assert "File Analysis:" not in result.output
 
 
-def test_cli_directory_symbolic_link_creation():
+def test_cli_both_mode(runner):
+    """Test that --both reports file and directory duplicates from one run."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+
+        for name in ("dir1", "dir2"):
+            (tmp_path / name).mkdir()
+            (tmp_path / name / "file1.txt").write_text("content1")
+            (tmp_path / name / "file2.txt").write_text("content2")
+        (tmp_path / "loose.txt").write_text("content1")
+
+        result = runner.invoke(main, [str(tmp_path), "--both"])
+
+        assert result.exit_code == 0
+        assert "Files and Directory Trees" in result.output
+        assert "Directory Group 1:" in result.output
+        assert "File Group 1:" in result.output
+        assert "Directory Analysis:" in result.output
+        assert "File Analysis:" in result.output
+        # The single walk's bytes are counted once: the root's 40 bytes, not the file and directory totals added up
+        assert "Total space scanned: 40.0 B" in result.output
+
+
+def test_cli_directory_symbolic_link_creation(runner):
     """Test that CLI creates symbolic links for directories when --directories and --delete are used."""
     with tempfile.TemporaryDirectory() as tmpdir:
         tmp_path = Path(tmpdir)
@@ -287,7 +457,6 @@ def test_cli_directory_symbolic_link_creation():
         assert dir1.exists() and dir1.is_dir()
         assert dir2.exists() and dir2.is_dir()
 
-        runner = CliRunner()
         # Use --directories and --delete flags and automatically confirm with 'y'
         result = runner.invoke(main, [str(tmp_path), "--directories", "--delete"], input="y\n")
 
@@ -314,7 +483,7 @@ def test_cli_directory_symbolic_link_creation():
         assert (dir2 / "file2.txt").read_text() == content2
 
 
-def test_cli_with_min_dir_size_filter():
+def test_cli_with_min_dir_size_filter(runner):
     """Test CLI with minimum directory size filter."""
     with tempfile.TemporaryDirectory() as tmpdir:
         tmp_path = Path(tmpdir)
@@ -344,7 +513,6 @@ def test_cli_with_min_dir_size_filter():
         (large_dir2 / "file1.txt").write_text(large_content)
         (large_dir2 / "file2.txt").write_text(large_content)
 
-        runner = CliRunner()
         result = runner.invoke(main, [str(tmp_path), "--directories", "--min-dir-size", "1500"])  # Only large directories should be considered
 
         assert result.exit_code == 0
@@ -357,11 +525,31 @@ def test_cli_with_min_dir_size_filter():
             assert str(small_dir2) not in result.output
 
 
-def test_cli_help_includes_min_dir_size():
+def test_cli_help_includes_min_dir_size(runner):
     """Test that CLI help includes --min-dir-size option."""
-    runner = CliRunner()
     result = runner.invoke(main, ["--help"])
 
     assert result.exit_code == 0
     assert "--min-dir-size" in result.output
     assert "Minimum directory size in bytes" in result.output
+
+
+def test_cli_opens_single_shared_cache(monkeypatch, runner):
+    """Test that one cache is opened per run and handed to the scanner."""
+    opened: list[ChecksumCache] = []
+
+    class CountingCache(ChecksumCache):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            opened.append(self)
+
+    monkeypatch.setattr(cli_module, "ChecksumCache", CountingCache)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        (tmp_path / "a.txt").write_text("same")
+        (tmp_path / "b.txt").write_text("same")
+
+        assert runner.invoke(main, [str(tmp_path)]).exit_code == 0
+        assert runner.invoke(main, [str(tmp_path), "--directories"]).exit_code == 0
+
+    assert len(opened) == 2
@@ -1,5 +1,7 @@
 """Tests for deduplication logic."""
 
+import errno
+import os
 import tempfile
 from pathlib import Path
 
@@ -14,6 +16,14 @@ def test_format_size():
     assert format_size(1024) == "1.0 KB"
     assert format_size(1536) == "1.5 KB"
     assert format_size(1024 * 1024) == "1.0 MB"
+    assert format_size(1024 * 1024 - 1) == "1024.0 KB"
+    assert format_size(3 * 1024**4) == "3.0 TB"
+    assert format_size(2048 * 1024**5) == "2048.0 PB"
+
+    # Repeated sizes are served from the memo
+    hits = format_size.cache_info().hits
+    assert format_size(1536) == "1.5 KB"
+    assert format_size.cache_info().hits == hits + 1
 
 
 def test_analyze_duplicates():
@@ -60,7 +70,7 @@ def test_analyze_duplicates():
 
 
 def test_path_preference_avoids_undesirable_folders():
-    """Test that path preference avoids 'New Folder' and 'Recycle' paths."""
+    """Test that path preference avoids 'New Folder', 'Recycle', 'Trash' and '.cache' paths."""
     with tempfile.TemporaryDirectory() as tmpdir:
         tmp_path = Path(tmpdir)
 
@@ -68,20 +78,26 @@ def test_path_preference_avoids_undesirable_folders():
         good_file = tmp_path / "documents" / "file.txt"
         new_folder_file = tmp_path / "New Folder" / "file.txt"
         recycle_file = tmp_path / "deep" / "Recycle Bin" / "file.txt"
+        trash_file = tmp_path / ".Trash" / "file.txt"
+        cache_file = tmp_path / ".cache" / "file.txt"
 
         # Create directories
         good_file.parent.mkdir(parents=True)
         new_folder_file.parent.mkdir(parents=True)
         recycle_file.parent.mkdir(parents=True)
+        trash_file.parent.mkdir(parents=True)
+        cache_file.parent.mkdir(parents=True)
 
         # Write same content to all files
         content = "duplicate content"
         good_file.write_text(content)
         new_folder_file.write_text(content)
         recycle_file.write_text(content)
+        trash_file.write_text(content)
+        cache_file.write_text(content)
 
         # Create FileInfo objects
-        files = [FileInfo(f) for f in [good_file, new_folder_file, recycle_file]]
+        files = [FileInfo(f) for f in [good_file, new_folder_file, recycle_file, trash_file, cache_file]]
 
         # Group by checksum (they should all be the same)
         checksum = files[0].checksum
@@ -98,7 +114,25 @@ def test_path_preference_avoids_undesirable_folders():
 
         # Should remove the files in undesirable paths
         remove_paths = {f.path for f in group.remove_files}
-        assert remove_paths == {new_folder_file, recycle_file}
+        assert remove_paths == {new_folder_file, recycle_file, trash_file, cache_file}
+
+
+def test_path_preference_matches_trash_only_as_whole_folder_name():
+    """Test that names merely containing 'trash' are not treated as trash folders."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+
+        designs_file = tmp_path / "trashcan_designs" / "file.txt"
+        talk_file = tmp_path / "Trash Talk" / "file.txt"
+        trash_file = tmp_path / ".Trash-1000" / "files" / "file.txt"
+        for path in (designs_file, talk_file, trash_file):
+            path.parent.mkdir(parents=True)
+            path.write_text("duplicate content")
+
+        deduplicator = Deduplicator()
+        scores = {path: deduplicator._get_path_preference_score(FileInfo(path))[0] for path in (designs_file, talk_file, trash_file)}
+
+        assert scores == {designs_file: 0, talk_file: 0, trash_file: 1}
 
 
 def test_path_preference_depth_tiebreaker():
@@ -136,6 +170,41 @@ def test_path_preference_depth_tiebreaker():
         assert group.remove_files[0].path == deep_file
 
 
+def test_path_preference_orders_every_copy():
+    """Test that removals follow the full preference order: undesirable paths last, then depth, then path."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+
+        b_file = tmp_path / "b" / "file.txt"
+        a_file = tmp_path / "a" / "file.txt"
+        deep_file = tmp_path / "a" / "nested" / "file.txt"
+        trash_file = tmp_path / "Trash" / "file.txt"
+        for path in (b_file, a_file, deep_file, trash_file):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("duplicate content")
+
+        files = [FileInfo(f) for f in (trash_file, deep_file, b_file, a_file)]
+        result = Deduplicator().analyze_duplicates({files[0].checksum: files})
+
+        group = result.groups[0]
+        assert group.keep_file.path == a_file
+        assert [f.path for f in group.remove_files] == [b_file, deep_file, trash_file]
+
+
+def test_analysis_keeps_scanned_paths_as_strings():
+    """Test that scoring and sorting files from a scan never builds their Path objects."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = [os.path.join(tmpdir, name) for name in ("b.txt", "a.txt")]
+        for path in paths:
+            Path(path).write_text("duplicate content")
+
+        files = [FileInfo(path) for path in paths]
+        result = Deduplicator().analyze_duplicates({files[0].checksum: files})
+
+        assert result.groups[0].keep_file.path_str == paths[1]
+        assert all(f._path is None for f in files)
+
+
 def test_groups_sorted_by_space_saved():
     """Test that duplicate groups are sorted by space saved (largest first)."""
     with tempfile.TemporaryDirectory() as tmpdir:
@@ -177,6 +246,7 @@ def test_groups_sorted_by_space_saved():
         second_space_saved = sum(f.size for f in second_group.remove_files)
 
         assert first_space_saved >= second_space_saved
+        assert [group.space_to_free for group in result.groups] == [first_space_saved, second_space_saved]
 
         # The large group should come first
         assert first_group.keep_file.path in {large1, large2}
@@ -252,6 +322,57 @@ def test_mixed_file_and_directory_deduplication():
         assert result.total_directories_to_remove == 1
 
 
+def test_files_inside_removed_directories_are_skipped():
+    """Test that file duplicates inside a directory being linked are neither linked nor counted twice."""
+    from dedupe_tree.directory_scanner import DirectoryInfo
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        for name in ("dir1", "dir2"):
+            (tmp_path / name).mkdir()
+            (tmp_path / name / "a.txt").write_text("content")
+        (tmp_path / "a.txt").write_text("content")
+
+        files = [FileInfo(tmp_path / name / "a.txt") for name in ("", "dir1", "dir2")]
+        dirs = [DirectoryInfo(path=tmp_path / name, checksum="dir123", size=7, file_count=1, depth=1) for name in ("dir1", "dir2")]
+
+        result = Deduplicator().analyze_duplicates({files[0].checksum: files}, {"dir123": dirs})
+
+        assert result.directory_groups[0].remove_directories == [dirs[1]]
+        assert [f.path for f in result.groups[0].remove_files] == [tmp_path / "dir1" / "a.txt"]
+        assert result.total_space_to_free == 14
+
+
+def test_directories_inside_removed_directories_are_skipped():
+    """Test that a duplicate group nested in a directory being linked is dropped, so the kept copy survives."""
+    from dedupe_tree.directory_scanner import DirectoryInfo
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        for name in ("A", "B"):
+            (tmp_path / name / "sub").mkdir(parents=True)
+            (tmp_path / name / "top.txt").write_text("top")
+            (tmp_path / name / "sub" / "data.txt").write_text("data")
+
+        subs = [DirectoryInfo(path=tmp_path / name / "sub", checksum="sub123", size=4, file_count=1, depth=2) for name in ("A", "B")]
+        outer = [DirectoryInfo(path=tmp_path / name, checksum="dir123", size=7, file_count=2, depth=1) for name in ("A", "B")]
+
+        # The nested group comes first, so dropping it does not depend on the order groups are given in
+        deduplicator = Deduplicator()
+        result = deduplicator.analyze_duplicates({}, {"sub123": subs, "dir123": outer})
+
+        assert [group.checksum for group in result.directory_groups] == ["dir123"]
+        assert result.total_directories_to_remove == 1
+        assert result.total_space_to_free == 7
+
+        deduplicator.execute_removal(result, dry_run=False)
+
+        assert (tmp_path / "B").is_symlink()
+        assert not (tmp_path / "A" / "sub").is_symlink()
+        assert (tmp_path / "A" / "sub" / "data.txt").read_text() == "data"
+        assert deduplicator.errors == []
+
+
 def test_execute_removal_creates_symbolic_links():
     """Test that execute_removal creates symbolic links instead of deleting files."""
     with tempfile.TemporaryDirectory() as tmpdir:
@@ -360,6 +481,60 @@ def test_execute_removal_creates_directory_symbolic_links():
         assert (removed_dir / "file.txt").read_text() == "content"
 
 
+def test_execute_removal_hard_links(monkeypatch):
+    """Test that files can be replaced with hard links, falling back to symbolic links across devices."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        keep, linked, crossing = (tmp_path / name for name in ("a.txt", "b.txt", "c.txt"))
+        for path in (keep, linked, crossing):
+            path.write_text("duplicate content")
+
+        real_link = os.link
+
+        def link(target, path):
+            if ".c.txt." in os.fspath(path):
+                raise OSError(errno.EXDEV, "Invalid cross-device link")
+            real_link(target, path)
+
+        monkeypatch.setattr(os, "link", link)
+        files = [FileInfo(f) for f in (keep, linked, crossing)]
+        deduplicator = Deduplicator()
+        result = deduplicator.analyze_duplicates({files[0].checksum: files})
+        linked_files, _ = deduplicator.execute_removal(result, dry_run=False, use_symlinks=False)
+
+        assert linked_files == [linked, crossing]
+        assert not linked.is_symlink() and linked.stat().st_ino == keep.stat().st_ino
+        assert crossing.is_symlink() and crossing.resolve() == keep
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["a.txt", "b.txt", "c.txt"]
+
+
+def test_execute_removal_marks_directory_links_as_directories(monkeypatch):
+    """Test that directory links are created as directory links, which Windows needs to resolve them."""
+    from dedupe_tree.directory_scanner import DirectoryInfo
+
+    created = []
+    real_symlink = os.symlink
+
+    def recording_symlink(target, link, target_is_directory=False):
+        created.append(target_is_directory)
+        real_symlink(target, link, target_is_directory)
+
+    monkeypatch.setattr(os, "symlink", recording_symlink)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        for name in ("a", "b"):
+            (tmp_path / name).mkdir()
+            (tmp_path / name / "file.txt").write_text("content")
+        dirs = [DirectoryInfo(path=tmp_path / name, checksum="dir123", size=7, file_count=1, depth=1) for name in ("a", "b")]
+
+        deduplicator = Deduplicator()
+        result = deduplicator.analyze_duplicates({}, {"dir123": dirs})
+        deduplicator.execute_removal(result, dry_run=False)
+
+        assert created == [True]
+        assert (tmp_path / "b").is_symlink()
+
+
 def test_execute_removal_dry_run():
     """Test that dry run mode doesn't actually create symbolic links."""
     with tempfile.TemporaryDirectory() as tmpdir:
@@ -392,3 +567,55 @@ def test_execute_removal_dry_run():
         assert file2.exists() and not file2.is_symlink()
         assert file1.read_text() == content
         assert file2.read_text() == content
+
+
+def test_execute_removal_keeps_original_when_replace_fails(monkeypatch):
+    """Test that a failed swap leaves the duplicate untouched and no staging files behind."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        file1 = tmp_path / "file1.txt"
+        file2 = tmp_path / "copy" / "file1.txt"
+        file2.parent.mkdir()
+        file1.write_text("content")
+        file2.write_text("content")
+
+        files = [FileInfo(f) for f in [file1, file2]]
+        deduplicator = Deduplicator()
+        result = deduplicator.analyze_duplicates({files[0].checksum: files})
+
+        def failing_replace(src, dst):
+            raise PermissionError("read-only")
+
+        monkeypatch.setattr("dedupe_tree.deduplicator.os.replace", failing_replace)
+        linked_files, _ = deduplicator.execute_removal(result, dry_run=False)
+
+        assert linked_files == []
+        assert [path for path, _ in deduplicator.errors] == [file2]
+        assert not file2.is_symlink()
+        assert file2.read_text() == "content"
+        assert sorted(p.name for p in file2.parent.iterdir()) == ["file1.txt"]
+
+
+def test_execute_removal_parallel_keeps_order():
+    """Test that replacing duplicates across several threads reports them in group order."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        keep = tmp_path / "keep.txt"
+        keep.write_text("content")
+        copies = []
+        for i in range(8):
+            copy = tmp_path / f"sub{i}" / "keep.txt"
+            copy.parent.mkdir()
+            copy.write_text("content")
+            copies.append(copy)
+
+        files = [FileInfo(f) for f in [keep, *copies]]
+        deduplicator = Deduplicator()
+        result = deduplicator.analyze_duplicates({files[0].checksum: files})
+        expected = [f.path for f in result.groups[0].remove_files]
+
+        linked_files, _ = deduplicator.execute_removal(result, dry_run=False, max_workers=4)
+
+        assert linked_files == expected
+        assert deduplicator.errors == []
+        assert all(path.is_symlink() and path.read_text() == "content" for path in expected)
@@ -3,7 +3,10 @@
 import tempfile
 from pathlib import Path
 
+import pytest
+
 from dedupe_tree.directory_scanner import DirectoryInfo, DirectoryScanner
+from dedupe_tree.hashing import hash_bytes
 
 
 def test_directory_info_basic():
@@ -129,6 +132,10 @@ def test_directory_scanner_nested_structure():
         assert any("level2" in str(path) for path in found_paths)
         assert any("level3" in str(path) for path in found_paths)
 
+        # Depth counts the levels below the scan root
+        depths = {d.path.relative_to(tmp_path).as_posix(): d.depth for d in scanner.scanned_directories}
+        assert depths == {".": 0, "complex": 1, "complex/level1": 2, "complex/level1/level2": 3, "complex/level1/level2/level3": 4}
+
 
 def test_directory_scanner_min_files_filter():
     """Test minimum files filtering."""
@@ -157,6 +164,153 @@ def test_directory_scanner_min_files_filter():
         assert dir_with_1_file not in found_paths
 
 
+def test_directory_scanner_min_size_filter():
+    """Test that directories below min_size are counted but never collected."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+
+        small_dir = tmp_path / "small"
+        large_dir = tmp_path / "large"
+        small_dir.mkdir()
+        large_dir.mkdir()
+        (small_dir / "a.txt").write_text("x")
+        (small_dir / "b.txt").write_text("y")
+        (large_dir / "a.txt").write_text("x" * 500)
+        (large_dir / "b.txt").write_text("y" * 500)
+
+        scanner = DirectoryScanner()
+        scanner.scan_directory_tree(tmp_path, min_files=2, min_size=100)
+
+        # The root (1002 bytes) and the large directory remain
+        assert {d.path for d in scanner.scanned_directories} == {tmp_path, large_dir}
+        assert sorted(scanner.sizes) == [1000, 1002]
+        assert scanner.total_bytes == 2002
+        assert scanner.skipped_small == 1
+
+
+def test_directory_scanner_records_files_for_file_scanner(monkeypatch):
+    """Test that one directory walk also fills a FileScanner whose duplicates need no further reads."""
+    from dedupe_tree import scanner as scanner_module
+    from dedupe_tree.scanner import FileScanner
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+
+        for name in ("dir1", "dir2"):
+            (tmp_path / name).mkdir()
+            (tmp_path / name / "a.txt").write_text("same")
+            (tmp_path / name / "b.md").write_text("other")
+        (tmp_path / "linked").symlink_to(tmp_path / "dir1")
+
+        dir_scanner = DirectoryScanner()
+        file_scanner = FileScanner(cache=dir_scanner.cache)
+        dir_scanner.scan_directory_tree(tmp_path, file_scanner=file_scanner, extensions={".txt"})
+
+        # Files behind the symlinked directory are not recorded, as with FileScanner.scan_directory
+        assert sorted(f.path for f in file_scanner.scanned_files) == [tmp_path / "dir1" / "a.txt", tmp_path / "dir2" / "a.txt"]
+        # The FileInfo objects are shared, so they already carry the checksums the walk computed
+        assert all(f._checksum is not None for f in file_scanner.scanned_files)
+
+        def fail_hash(*args, **kwargs):
+            raise AssertionError("file was read a second time")
+
+        def fail_lookup(rows):
+            assert list(rows) == [], "checksum already known was looked up again"
+            return {}
+
+        monkeypatch.setattr(scanner_module, "hash_file", fail_hash)
+        monkeypatch.setattr(dir_scanner.cache, "get_checksum_many", fail_lookup)
+        assert [len(group) for group in file_scanner.get_duplicates().values()] == [2]
+
+
+def test_directory_scanner_parallel_hashing_matches_serial():
+    """Test that hashing files on several threads yields the same directory checksums as one thread."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        for name in ("dir1", "dir2", "dir1/nested"):
+            (tmp_path / name).mkdir()
+            for i in range(5):
+                (tmp_path / name / f"file{i}.txt").write_text(f"{name}-{i}" if name != "dir2" else f"dir1-{i}")
+
+        checksums = []
+        for workers in (1, 4):
+            scanner = DirectoryScanner(max_workers=workers)
+            scanner.scan_directory_tree(tmp_path, min_files=1)
+            checksums.append({d.path: d.checksum for d in scanner.scanned_directories})
+
+        assert checksums[0] == checksums[1]
+        assert len(checksums[0]) == 4
+
+
+def test_directory_scanner_lists_subtrees_concurrently_into_file_scanner():
+    """Test that subtrees listed on several threads record every file once, with sizes kept in step."""
+    from dedupe_tree.scanner import FileScanner
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        for i in range(8):
+            (tmp_path / f"dir{i}" / "nested").mkdir(parents=True)
+            for j in range(10):
+                (tmp_path / f"dir{i}" / "nested" / f"file{j}.txt").write_text("x" * (i * 10 + j))
+
+        dir_scanner = DirectoryScanner(max_workers=4)
+        file_scanner = FileScanner(cache=dir_scanner.cache)
+        dir_scanner.scan_directory_tree(tmp_path, min_files=1, file_scanner=file_scanner)
+
+        assert len(file_scanner.scanned_files) == 80
+        assert list(file_scanner.sizes) == [f.size for f in file_scanner.scanned_files]
+        assert file_scanner.total_bytes == sum(range(80))
+        assert len(dir_scanner.scanned_directories) == 17
+
+
+def test_directory_scanner_skips_hashing_unique_sizes(monkeypatch):
+    """Test that files whose size occurs once in the tree are never read, without hiding real duplicates."""
+    from dedupe_tree import scanner as scanner_module
+
+    hashed = []
+    real_hash_file = scanner_module.hash_file
+
+    def recording_hash_file(path, *args, **kwargs):
+        hashed.append(Path(path).name)
+        return real_hash_file(path, *args, **kwargs)
+
+    monkeypatch.setattr(scanner_module, "hash_file", recording_hash_file)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        for name in ("dir1", "dir2", "dir3"):
+            (tmp_path / name).mkdir()
+            (tmp_path / name / "shared.txt").write_text("same")
+        (tmp_path / "dir3" / "unique.txt").write_text("only one file this long")
+
+        scanner = DirectoryScanner()
+        scanner.scan_directory_tree(tmp_path, min_files=1)
+
+        # dir3 holds a file of unique size, so it cannot match and none of its files are read
+        assert sorted(hashed) == ["shared.txt"] * 2
+        duplicates = scanner.get_duplicate_directories()
+        assert [sorted(d.path.name for d in group) for group in duplicates.values()] == [["dir1", "dir2"]]
+
+
+def test_directory_scanner_skips_files_with_unique_heads(monkeypatch):
+    """Test that large same-size files differing in their first HEAD_SIZE bytes are not fully read."""
+    from dedupe_tree import scanner as scanner_module
+    from dedupe_tree.hashing import HEAD_SIZE
+
+    monkeypatch.setattr(scanner_module, "hash_file", lambda *args, **kwargs: pytest.fail("file was fully read"))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        for name, fill in (("dir1", b"a"), ("dir2", b"b")):
+            (tmp_path / name).mkdir()
+            (tmp_path / name / "big.bin").write_bytes(fill * (HEAD_SIZE * 2))
+
+        scanner = DirectoryScanner()
+        scanner.scan_directory_tree(tmp_path, min_files=1)
+
+        assert scanner.get_duplicate_directories() == {}
+
+
 def test_directory_fingerprint_consistency():
     """Test that directory fingerprints are consistent."""
     with tempfile.TemporaryDirectory() as tmpdir:
@@ -183,6 +337,71 @@ def test_directory_fingerprint_consistency():
         assert "b.txt" in fingerprint1
 
 
+def test_directory_fingerprint_orders_names_case_insensitively():
+    """Test that entries are ordered ignoring case, with names differing only in case ordered exactly."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        for name in ("c.txt", "b.txt", "B.txt", "A.txt"):
+            (tmp_path / name).write_text(name)
+
+        scanner = DirectoryScanner()
+        scanner.scan_directory_tree(tmp_path, min_files=1)
+
+        fingerprint = scanner.get_directory_fingerprint(tmp_path)
+        assert fingerprint is not None
+        assert [line.split(":")[1] for line in fingerprint.splitlines()] == ["A.txt", "B.txt", "b.txt", "c.txt"]
+
+
+def test_directory_fingerprint_matches_checksum(monkeypatch):
+    """Test that the stored fingerprint is the one hashed, and is returned without rereading files."""
+    from dedupe_tree import scanner as scanner_module
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        for name in ("dir1", "dir2"):
+            (tmp_path / name).mkdir()
+            (tmp_path / name / "a.txt").write_text("content a")
+
+        scanner = DirectoryScanner()
+        scanner.scan_directory_tree(tmp_path, min_files=1)
+
+        monkeypatch.setattr(scanner_module, "hash_file", lambda *args, **kwargs: pytest.fail("file was reread"))
+        fingerprint = scanner.get_directory_fingerprint(tmp_path / "dir1")
+
+        assert fingerprint is not None
+        dir_info = next(d for d in scanner.scanned_directories if d.path == tmp_path / "dir1")
+        assert hash_bytes(fingerprint.encode(), scanner.cache.algorithm) == dir_info.checksum
+        assert scanner.get_directory_fingerprint(tmp_path / "missing") is None
+
+
+def test_directory_checksums_hashed_once_per_directory(monkeypatch):
+    """Test that each directory is hashed once from its children's digests, so deep trees cost linear time."""
+    from dedupe_tree import directory_scanner as directory_scanner_module
+
+    hashed: list[bytes] = []
+
+    def counting_hash_bytes(data, algorithm):
+        hashed.append(data)
+        return hash_bytes(data, algorithm)
+
+    monkeypatch.setattr(directory_scanner_module, "hash_bytes", counting_hash_bytes)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        directory = tmp_path
+        for depth in range(20):
+            directory = directory / f"level{depth}"
+            directory.mkdir()
+            (directory / "a.txt").write_text("same")
+            (directory / "b.txt").write_text("same")
+
+        scanner = DirectoryScanner()
+        scanner.scan_directory_tree(tmp_path, min_files=1)
+
+        # The root and its 20 nested levels; every file shares its size, so none is hashed by path
+        assert len(hashed) == 21
+        assert len(scanner.scanned_directories) == 21
+
+
 def test_directory_scanner_error_handling():
     """Test error handling for inaccessible directories."""
     with tempfile.TemporaryDirectory() as tmpdir:
@@ -201,3 +420,159 @@ def test_directory_scanner_error_handling():
         # Scanner should track some errors if any occurred
         # (errors list exists even if empty)
         assert hasattr(scanner, "errors")
+
+
+def test_directory_scanner_handles_trees_deeper_than_recursion_limit():
+    """Test that a tree nested more levels deep than Python's recursion limit is listed and checksummed."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        # Built and removed level by level, as mkdir(parents=True) and rmtree recurse once per level
+        levels = [tmp_path]
+        for _ in range(1200):
+            levels.append(levels[-1] / "d")
+            levels[-1].mkdir()
+        (levels[-1] / "deep.txt").write_text("deep")
+
+        try:
+            scanner = DirectoryScanner()
+            scanner.scan_directory_tree(tmp_path, min_files=1)
+
+            assert len(scanner.scanned_directories) == len(levels)
+            assert {d.file_count for d in scanner.scanned_directories} == {1}
+            assert scanner.errors == []
+        finally:
+            (levels[-1] / "deep.txt").unlink()
+            for level in reversed(levels[1:]):
+                level.rmdir()
+
+
+def test_directory_scanner_reports_errors_in_name_order(monkeypatch):
+    """Test that errors from subtrees listed concurrently are reported in name order, whichever finishes first."""
+    import os
+    import time
+
+    real_scandir = os.scandir
+
+    def deny_scandir(path):
+        name = os.path.basename(path) if isinstance(path, str) else ""
+        if name.endswith("_locked"):
+            # The first subtree fails last
+            if name == "a_locked":
+                time.sleep(0.05)
+            raise PermissionError(13, "Permission denied", path)
+        return real_scandir(path)
+
+    monkeypatch.setattr(os, "scandir", deny_scandir)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        for name in ("a_locked", "b_locked"):
+            (tmp_path / name).mkdir()
+
+        scanner = DirectoryScanner(max_workers=4)
+        scanner.scan_directory_tree(tmp_path, min_files=1)
+
+        assert [path for path, _ in scanner.errors] == [tmp_path / "a_locked", tmp_path / "b_locked"]
+
+
+def test_directory_scanner_reads_hard_linked_files_once(monkeypatch):
+    """Test that directories holding hard links to one file match, reading the file once."""
+    import os
+
+    from dedupe_tree import scanner as scanner_module
+
+    hashed = []
+    real_hash_file = scanner_module.hash_file
+
+    def recording_hash_file(path, *args, **kwargs):
+        hashed.append(path)
+        return real_hash_file(path, *args, **kwargs)
+
+    monkeypatch.setattr(scanner_module, "hash_file", recording_hash_file)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        for name in ("dir1", "dir2"):
+            (tmp_path / name).mkdir()
+        (tmp_path / "dir1" / "a.txt").write_text("linked content")
+        os.link(tmp_path / "dir1" / "a.txt", tmp_path / "dir2" / "a.txt")
+        (tmp_path / "dir1" / "b.txt").write_text("copy")
+        (tmp_path / "dir2" / "b.txt").write_text("copy")
+
+        scanner = DirectoryScanner()
+        scanner.scan_directory_tree(tmp_path, min_files=2)
+
+        groups = list(scanner.get_duplicate_directories().values())
+        assert [{d.path for d in group} for group in groups] == [{tmp_path / "dir1", tmp_path / "dir2"}]
+        assert sorted(Path(path).relative_to(tmp_path).as_posix() for path in hashed) == ["dir1/b.txt", "dir2/b.txt"]
+
+
+def test_directory_scanner_shares_hard_linked_files_across_concurrent_subtrees(monkeypatch):
+    """Test that links listed by two subtrees at the same time still share one FileInfo, so the file is read once."""
+    import os
+    import time
+
+    from dedupe_tree import directory_scanner as directory_scanner_module
+    from dedupe_tree import scanner as scanner_module
+    from dedupe_tree.scanner import FileInfo
+
+    class SlowFileInfo(FileInfo):
+        """Widens the window between looking up a link and recording it."""
+
+        def __init__(self, path, cache=None, stat_result=None):
+            if stat_result is not None and stat_result.st_nlink > 1:
+                time.sleep(0.05)
+            super().__init__(path, cache, stat_result)
+
+    hashed = []
+    real_hash_file = scanner_module.hash_file
+
+    def recording_hash_file(path, *args, **kwargs):
+        hashed.append(Path(path).relative_to(tmp_path).as_posix())
+        return real_hash_file(path, *args, **kwargs)
+
+    monkeypatch.setattr(directory_scanner_module, "FileInfo", SlowFileInfo)
+    monkeypatch.setattr(scanner_module, "hash_file", recording_hash_file)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        for name in ("dir1", "dir2", "dir3"):
+            (tmp_path / name).mkdir()
+        (tmp_path / "dir1" / "a.txt").write_text("linked content")
+        os.link(tmp_path / "dir1" / "a.txt", tmp_path / "dir2" / "a.txt")
+        (tmp_path / "dir3" / "a.txt").write_text("linked content")
+
+        scanner = DirectoryScanner(max_workers=4)
+        scanner.scan_directory_tree(tmp_path, min_files=1)
+
+        assert len(hashed) == 2
+        assert "dir3/a.txt" in hashed
+
+
+def test_directory_scanner_hashes_matchable_subdirectories_of_unmatchable_ones(monkeypatch):
+    """Test that a directory ruled out by a unique size still has its matchable subdirectories hashed."""
+    from dedupe_tree import scanner as scanner_module
+
+    hashed = []
+    real_hash_file = scanner_module.hash_file
+
+    def recording_hash_file(path, *args, **kwargs):
+        hashed.append(Path(path).relative_to(tmp_path).as_posix())
+        return real_hash_file(path, *args, **kwargs)
+
+    monkeypatch.setattr(scanner_module, "hash_file", recording_hash_file)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        for name in ("outer/inner", "copy"):
+            (tmp_path / name).mkdir(parents=True)
+            (tmp_path / name / "data.txt").write_text("same")
+        (tmp_path / "outer" / "other.txt").write_text("same")
+        (tmp_path / "outer" / "unique.txt").write_text("only one file this long")
+
+        scanner = DirectoryScanner()
+        scanner.scan_directory_tree(tmp_path, min_files=1)
+
+        # outer/other.txt shares a size but sits beside the unique file, so it is not read
+        assert sorted(hashed) == ["copy/data.txt", "outer/inner/data.txt"]
+        duplicates = scanner.get_duplicate_directories()
+        assert [sorted(d.path.name for d in group) for group in duplicates.values()] == [["copy", "inner"]]
@@ -0,0 +1,148 @@
+"""Tests for file content hashing."""
+
+import hashlib
+import mmap
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from dedupe_tree.hashing import LARGE_FILE_THRESHOLD, MMAP_THRESHOLD, hash_bytes, hash_file, hash_head, is_available
+
+
+def test_hash_file_sha256():
+    """Test SHA256 hashing matches hashlib."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "test.txt"
+        path.write_text("hello world")
+
+        assert hash_file(str(path), "sha256") == hashlib.sha256(b"hello world").hexdigest()
+
+        # Spans several reads of the reused chunk buffer, with a short final chunk
+        data = bytes(range(256)) * 10_000
+        path.write_bytes(data)
+        assert hash_file(str(path), "sha256") == hashlib.sha256(data).hexdigest()
+
+
+def test_hash_file_sha256_strategies_agree():
+    """Test that chunked and memory-mapped SHA256 paths give one digest."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "data.bin"
+        data = bytes(range(256)) * ((MMAP_THRESHOLD // 256) + 3)
+        path.write_bytes(data)
+
+        expected = hashlib.sha256(data).hexdigest()
+        for size in (0, MMAP_THRESHOLD):
+            assert hash_file(str(path), "sha256", size=size) == expected
+
+        # A file that cannot be mapped is read in chunks instead
+        def refuse_mmap(*args, **kwargs):
+            raise OSError("mapping not supported")
+
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            monkeypatch.setattr(mmap, "mmap", refuse_mmap)
+            assert hash_file(str(path), "sha256", size=MMAP_THRESHOLD) == expected
+
+        # A file emptied after it was sized is hashed as empty rather than failing to map
+        path.write_bytes(b"")
+        assert hash_file(str(path), "sha256", size=MMAP_THRESHOLD) == hashlib.sha256(b"").hexdigest()
+
+
+def test_hash_file_blake3():
+    """Test BLAKE3 hashing matches the blake3 package."""
+    blake3 = pytest.importorskip("blake3")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "test.txt"
+        path.write_bytes(b"x" * (3 << 20))
+
+        assert hash_file(str(path), "blake3") == blake3.blake3(b"x" * (3 << 20)).hexdigest()
+
+
+def test_hash_file_errors():
+    """Test that unreadable files and unknown algorithms are reported."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        missing = str(Path(tmpdir) / "missing.txt")
+        with pytest.raises(OSError, match="Failed to calculate checksum"):
+            hash_file(missing, "sha256")
+
+        with pytest.raises(ValueError, match="Unsupported hash algorithm"):
+            hash_file(missing, "md5")
+
+    assert is_available("sha256")
+    assert not is_available("md5")
+
+
+def test_hash_file_blake3_large_file_matches_serial():
+    """Test that the multithreaded large-file path yields the same BLAKE3 digest."""
+    blake3 = pytest.importorskip("blake3")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "large.bin"
+        data = bytes(range(256)) * ((LARGE_FILE_THRESHOLD // 256) + 1)
+        path.write_bytes(data)
+
+        expected = blake3.blake3(data).hexdigest()
+        assert hash_file(str(path), "blake3") == expected
+        assert hash_file(str(path), "blake3", size=0) == expected
+
+
+def test_hash_head_covers_leading_bytes_only():
+    """Test that head hashes ignore everything after the first bytes."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        first = Path(tmpdir) / "first.bin"
+        second = Path(tmpdir) / "second.bin"
+        first.write_bytes(b"a" * 200 + b"tail one")
+        second.write_bytes(b"a" * 200 + b"tail two")
+
+        assert hash_head(str(first), "sha256", length=200) == hashlib.sha256(b"a" * 200).hexdigest()
+        assert hash_head(str(first), "sha256", length=200) == hash_head(str(second), "sha256", length=200)
+        assert hash_head(str(first), "sha256") != hash_head(str(second), "sha256")
+
+
+def test_hash_file_blake3_strategies_agree():
+    """Test that chunked, memory-mapped and multithreaded BLAKE3 paths give one digest."""
+    blake3 = pytest.importorskip("blake3")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "data.bin"
+        data = bytes(range(256)) * ((MMAP_THRESHOLD // 256) + 3)
+        path.write_bytes(data)
+
+        expected = blake3.blake3(data).hexdigest()
+        for size in (0, MMAP_THRESHOLD, LARGE_FILE_THRESHOLD):
+            assert hash_file(str(path), "blake3", size=size) == expected
+
+
+@pytest.mark.parametrize("algorithm", [a for a in ("blake3", "sha256") if is_available(a)])
+def test_hash_bytes_matches_hash_file(algorithm):
+    """Test that hashing a buffer gives the digest of a file holding it."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "data.bin"
+        path.write_bytes(b"fingerprint\n" * 100)
+
+        assert hash_bytes(path.read_bytes(), algorithm) == hash_file(str(path), algorithm)
+
+
+@pytest.mark.skipif(not hasattr(os, "posix_fadvise"), reason="posix_fadvise is not available")
+@pytest.mark.parametrize(
+    ("size", "sequential"),
+    [(1 << 10, False), (2 << 20, True), (MMAP_THRESHOLD, False)],
+)
+@pytest.mark.parametrize("algorithm", [a for a in ("blake3", "sha256") if is_available(a)])
+def test_hash_file_releases_pages_after_reading(monkeypatch, size, sequential, algorithm):
+    """Test that a fully hashed file's pages are then dropped, with the read-ahead hint only for multi-chunk reads."""
+    advice = []
+    real_fadvise = os.posix_fadvise
+
+    def recording_fadvise(fd, offset, length, hint):
+        advice.append(hint)
+        real_fadvise(fd, offset, length, hint)
+
+    monkeypatch.setattr(os, "posix_fadvise", recording_fadvise)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "data.bin"
+        path.write_bytes(b"x" * size)
+
+        hash_file(str(path), algorithm)
+
+    # A memory map is hinted through madvise() instead
+    assert advice == ([os.POSIX_FADV_SEQUENTIAL] if sequential else []) + [os.POSIX_FADV_DONTNEED]
@@ -1,8 +1,14 @@
 """Tests for file scanner functionality."""
 
+import os
 import tempfile
 from pathlib import Path
 
+import pytest
+
+import dedupe_tree.scanner as scanner_module
+from dedupe_tree.cache import ChecksumCache
+from dedupe_tree.hashing import DEFAULT_HASH_ALGORITHM, HEAD_SIZE
 from dedupe_tree.scanner import FileInfo, FileScanner
 
 
@@ -14,8 +20,11 @@ def test_file_info_checksum():
 
     try:
         file_info = FileInfo(temp_path)
-        # SHA256 of "hello world"
-        expected = "b94d27b9934d3e08a52e52d7da7dabfac484efe37a5380ee9088f7ace2efcde9"
+        # SHA256 or, when installed, BLAKE3 of "hello world"
+        expected = {
+            "sha256": "b94d27b9934d3e08a52e52d7da7dabfac484efe37a5380ee9088f7ace2efcde9",
+            "blake3": "d74981efa70a0c880b8d8c1985d075dbcbf679b99a5f9914e5aaf96b831a9e24",
+        }[DEFAULT_HASH_ALGORITHM]
         assert file_info.checksum == expected
     finally:
         temp_path.unlink()
@@ -34,13 +43,36 @@ def test_file_info_depth():
 
             return MockStat()
 
-    mock_path = MockPath("/a/b/c/file.txt")
-    file_info = FileInfo(mock_path)
+    # Depth is counted from separators, which must match the number of parts past the root
+    # (/a/b/c/file.txt has 5 parts: ['/', 'a', 'b', 'c', 'file.txt'])
+    for path in ("/file.txt", "/a/file.txt", "/a/b/c/file.txt", "/a b/c.d/.hidden/file.tar.gz"):
+        mock_path = MockPath(path)
+        file_info = FileInfo(mock_path)
+        assert file_info.depth == len(mock_path.parts) - 1
+    assert file_info.depth == 4
+
+
+def test_file_info_stats_once(monkeypatch):
+    """Test that a FileInfo takes size, modification time and depth from a single stat call."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "data.txt")
+        Path(path).write_text("data")
+        expected = os.stat(path)
+
+        calls = []
+        real_stat = os.stat
+
+        def counting_stat(*args, **kwargs):
+            calls.append(args[0])
+            return real_stat(*args, **kwargs)
 
-    # Depth should be number of parts - 1 (for root)
-    # /a/b/c/file.txt has 5 parts: ['/', 'a', 'b', 'c', 'file.txt']
-    # But Path.parts on different systems may vary, so test relative depth
-    assert file_info.depth >= 0
+        monkeypatch.setattr(os, "stat", counting_stat)
+        file_info = FileInfo(path)
+
+        assert (file_info.size, file_info.modification_time) == (4, expected.st_mtime)
+        assert file_info.depth == path.count(os.sep)
+        assert file_info.path.name == "data.txt"
+        assert calls == [path]
 
 
 def test_scanner_find_duplicates():
@@ -116,3 +148,344 @@ def test_scanner_extensions_case_insensitive():
 
         found_extensions = {f.path.suffix for f in scanner.scanned_files}
         assert found_extensions == {".TXT", ".Py"}
+
+        # Extensions given in upper case match as well
+        upper_scanner = FileScanner()
+        upper_scanner.scan_directory(tmp_path, extensions={".TXT", ".PY"})
+        assert {f.path.suffix for f in upper_scanner.scanned_files} == {".TXT", ".Py"}
+
+
+def test_scanner_extension_filter_matches_multi_part_suffixes():
+    """Test that extensions are matched as name suffixes, so compound ones like .tar.gz work."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        for name in ("a.tar.gz", "b.gz", "c.TAR.GZ"):
+            (tmp_path / name).write_text(name)
+
+        scanner = FileScanner()
+        scanner.scan_directory(tmp_path, (".tar.gz",))
+
+        assert sorted(f.path.name for f in scanner.scanned_files) == ["a.tar.gz", "c.TAR.GZ"]
+
+
+def test_scanner_sizes_track_scanned_files():
+    """Test that the size array stays in sync with scanned files."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+
+        (tmp_path / "small.txt").write_text("x")
+        (tmp_path / "large.txt").write_text("x" * 100)
+
+        scanner = FileScanner()
+        scanner.scan_directory(tmp_path)
+        assert sum(scanner.sizes) == scanner.total_bytes == 101
+        # Scanned files keep their string path and build a Path only on request
+        assert scanner.scanned_files[0].path_str.startswith(tmpdir)
+        assert scanner.scanned_files[0]._path is None
+        assert scanner.scanned_files[0].path.parent == tmp_path
+        # FileInfo is slotted, so large scans carry no per-object __dict__
+        assert not hasattr(scanner.scanned_files[0], "__dict__")
+
+        assert scanner.apply_min_size(50) == 1
+        assert [f.size for f in scanner.scanned_files] == list(scanner.sizes) == [100]
+        assert scanner.total_bytes == 100
+
+
+def test_scanner_min_size_skips_during_scan():
+    """Test that files below min_size are counted but never collected."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+
+        (tmp_path / "small.txt").write_text("x")
+        (tmp_path / "tiny.py").write_text("y")
+        (tmp_path / "large.txt").write_text("x" * 100)
+        (tmp_path / "subdir").mkdir()
+
+        scanner = FileScanner()
+        scanner.scan_directory(tmp_path, {".txt"}, min_size=50)
+        assert [f.path.name for f in scanner.scanned_files] == ["large.txt"]
+        assert list(scanner.sizes) == [100]
+        assert scanner.skipped_small == 1
+
+        scanner.clear()
+        assert scanner.skipped_small == 0
+
+
+def test_scanner_parallel_hashing_persists_checksums():
+    """Test that checksums hashed on worker threads are grouped in scan order and cached."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        data_dir = tmp_path / "data"
+        data_dir.mkdir()
+        for i in range(20):
+            (data_dir / f"file{i:02d}.txt").write_text(f"content {i % 5}")
+
+        with ChecksumCache(tmp_path / "cache.db") as cache:
+            # Cached checksums are looked up in one batch, never one file at a time
+            cache.get_checksum = lambda *args: pytest.fail("per-file cache lookup")
+            scanner = FileScanner(cache=cache, max_workers=4)
+            scanner.scan_directory(data_dir)
+            duplicates = scanner.get_duplicates()
+
+            assert len(duplicates) == 5
+            for group in duplicates.values():
+                paths = [f.path for f in group]
+                assert len(paths) == 4
+                assert paths == [f.path for f in scanner.scanned_files if f.path in paths]
+
+        with ChecksumCache(tmp_path / "cache.db") as cache:
+            assert cache.get_cache_stats()["total_entries"] == 20
+
+
+def test_scanner_context_leaves_shared_cache_open():
+    """Test that a scanner used as a context manager does not close a cache its caller still holds."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        with ChecksumCache(tmp_path / "cache.db") as cache:
+            with FileScanner(cache=cache) as scanner:
+                scanner.get_cache_stats()
+            assert cache._connection is not None
+        assert cache._connection is None
+
+
+def test_scanner_skips_hashing_unique_sizes():
+    """Test that files whose size is unique are never hashed."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        (tmp_path / "a.txt").write_text("same")
+        (tmp_path / "b.txt").write_text("same")
+        (tmp_path / "c.txt").write_text("diff")
+        (tmp_path / "unique.txt").write_text("a longer unique file")
+
+        with ChecksumCache(tmp_path / "cache.db") as cache:
+            scanner = FileScanner(cache=cache)
+            scanner.scan_directory(tmp_path, {".txt"})
+            duplicates = scanner.get_duplicates()
+
+            assert [sorted(f.path.name for f in group) for group in duplicates.values()] == [["a.txt", "b.txt"]]
+            hashed = {f.path.name for f in scanner.scanned_files if f._checksum is not None}
+            assert hashed == {"a.txt", "b.txt", "c.txt"}
+
+
+def test_scanner_hashes_largest_files_first(monkeypatch):
+    """Test that the largest files are read first while groups keep their scan order."""
+    read_sizes = []
+    real_hash_file = scanner_module.hash_file
+
+    def recording_hash_file(path, algorithm, size):
+        read_sizes.append(size)
+        return real_hash_file(path, algorithm, size)
+
+    monkeypatch.setattr(scanner_module, "hash_file", recording_hash_file)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        for name, size in (("a", 10), ("b", 30), ("c", 20)):
+            (tmp_path / f"{name}1.bin").write_bytes(b"x" * size)
+            (tmp_path / f"{name}2.bin").write_bytes(b"x" * size)
+
+        scanner = FileScanner(max_workers=1)
+        scanner.scan_directory(tmp_path)
+        duplicates = scanner.get_duplicates()
+
+        assert read_sizes == [30, 30, 20, 20, 10, 10]
+        scan_order = [f.size for f in scanner.scanned_files if f.path.name.endswith("1.bin")]
+        assert [group[0].size for group in duplicates.values()] == scan_order
+
+
+def test_scanner_rescan_reads_no_file_contents(monkeypatch):
+    """Test that rescanning an unchanged tree answers every checksum from the cache, large files included."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        data_dir = tmp_path / "data"
+        data_dir.mkdir()
+        body = b"x" * (HEAD_SIZE * 2)
+        for name in ("a.bin", "b.bin"):
+            (data_dir / name).write_bytes(body)
+            (data_dir / f"small_{name}").write_bytes(b"small")
+
+        with ChecksumCache(tmp_path / "cache.db") as cache:
+            first = FileScanner(cache=cache)
+            first.scan_directory(data_dir)
+            expected = first.get_duplicates()
+
+            monkeypatch.setattr(scanner_module, "hash_file", lambda *args: pytest.fail("file contents reread"))
+            monkeypatch.setattr(scanner_module, "hash_head", lambda *args: pytest.fail("file head reread"))
+            rescanner = FileScanner(cache=cache)
+            rescanner.scan_directory(data_dir)
+
+            assert rescanner.get_duplicates().keys() == expected.keys()
+
+
+def test_scanner_small_files_skip_head_hash(monkeypatch):
+    """Test that files no larger than HEAD_SIZE are hashed once in full, never read for their head first."""
+    monkeypatch.setattr(scanner_module, "hash_head", lambda *args: pytest.fail("head read of a small file"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        body = b"x" * HEAD_SIZE
+        (tmp_path / "a.bin").write_bytes(body)
+        (tmp_path / "b.bin").write_bytes(body)
+        (tmp_path / "c.bin").write_bytes(b"y" + body[1:])
+
+        scanner = FileScanner()
+        scanner.scan_directory(tmp_path)
+
+        assert [sorted(f.path.name for f in group) for group in scanner.get_duplicates().values()] == [["a.bin", "b.bin"]]
+
+
+def test_scanner_head_hash_prunes_large_files():
+    """Test that large files differing in their first bytes are never fully hashed."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        body = b"x" * (HEAD_SIZE * 2)
+        (tmp_path / "a.bin").write_bytes(body)
+        (tmp_path / "b.bin").write_bytes(body)
+        (tmp_path / "head_differs.bin").write_bytes(b"y" + body[1:])
+        (tmp_path / "tail_differs.bin").write_bytes(body[:-1] + b"y")
+
+        with ChecksumCache(tmp_path / "cache.db") as cache:
+            scanner = FileScanner(cache=cache)
+            scanner.scan_directory(tmp_path, {".bin"})
+            duplicates = scanner.get_duplicates()
+
+            assert [sorted(f.path.name for f in group) for group in duplicates.values()] == [["a.bin", "b.bin"]]
+            hashed = {f.path.name for f in scanner.scanned_files if f._checksum is not None}
+            assert hashed == {"a.bin", "b.bin", "tail_differs.bin"}
+
+
+def test_scanner_head_hash_checks_new_files_against_cached_ones():
+    """Test that a new file is compared by its head with same-size files whose checksums are cached."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        body = b"x" * (HEAD_SIZE * 2)
+        (tmp_path / "a.bin").write_bytes(body)
+        (tmp_path / "b.bin").write_bytes(body)
+
+        with ChecksumCache(tmp_path / "cache.db") as cache:
+            scanner = FileScanner(cache=cache)
+            scanner.scan_directory(tmp_path, {".bin"})
+            scanner.get_duplicates()
+
+            (tmp_path / "new.bin").write_bytes(b"y" + body[1:])
+            rescanner = FileScanner(cache=cache)
+            rescanner.scan_directory(tmp_path, {".bin"})
+            duplicates = rescanner.get_duplicates()
+
+            assert [sorted(f.path.name for f in group) for group in duplicates.values()] == [["a.bin", "b.bin"]]
+            hashed = {f.path.name for f in rescanner.scanned_files if f._checksum is not None}
+            assert hashed == {"a.bin", "b.bin"}
+
+
+@pytest.mark.parametrize("by_descriptor", [True, False])
+def test_scanner_walk_skips_symlinked_directories(monkeypatch, by_descriptor):
+    """Test that both walks find files in nested folders but follow no symlinks, to files or directories."""
+    if not by_descriptor:
+        monkeypatch.setattr(os, "supports_fd", set())
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        nested = tmp_path / "a" / "b"
+        nested.mkdir(parents=True)
+        (nested / "deep.txt").write_text("deep")
+        (tmp_path / "top.txt").write_text("top")
+        (tmp_path / "linked_dir").symlink_to(tmp_path / "a")
+        (tmp_path / "linked.txt").symlink_to(tmp_path / "top.txt")
+
+        scanner = FileScanner()
+        scanner.scan_directory(tmp_path)
+
+        assert sorted(f.path.relative_to(tmp_path).as_posix() for f in scanner.scanned_files) == ["a/b/deep.txt", "top.txt"]
+        assert scanner.errors == []
+
+
+@pytest.mark.parametrize("by_descriptor", [True, False])
+def test_scanner_walk_records_unreadable_directories(monkeypatch, by_descriptor):
+    """Test that both walks record a directory they cannot list as an error and scan everything else."""
+    real_open, real_scandir = os.open, os.scandir
+
+    def deny_open(path, *args, **kwargs):
+        if path == "locked":
+            raise PermissionError(13, "Permission denied", path)
+        return real_open(path, *args, **kwargs)
+
+    def deny_scandir(path):
+        if isinstance(path, str) and os.path.basename(path) == "locked":
+            raise PermissionError(13, "Permission denied", path)
+        return real_scandir(path)
+
+    # Denied through the calls each walk lists directories with, as root can list any directory
+    if by_descriptor:
+        monkeypatch.setattr(os, "open", deny_open)
+    else:
+        monkeypatch.setattr(os, "supports_fd", set())
+        monkeypatch.setattr(os, "scandir", deny_scandir)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        (tmp_path / "locked").mkdir()
+        (tmp_path / "locked" / "hidden.txt").write_text("hidden")
+        (tmp_path / "open").mkdir()
+        (tmp_path / "open" / "seen.txt").write_text("seen")
+
+        scanner = FileScanner()
+        scanner.scan_directory(tmp_path)
+
+        assert [f.path.name for f in scanner.scanned_files] == ["seen.txt"]
+        assert [(path, type(error)) for path, error in scanner.errors] == [(tmp_path / "locked", PermissionError)]
+
+
+@pytest.mark.parametrize("by_descriptor", [True, False])
+def test_scanner_walk_handles_trees_deeper_than_recursion_limit(monkeypatch, by_descriptor):
+    """Test that both walks scan a tree nested more levels deep than Python's recursion limit."""
+    if not by_descriptor:
+        monkeypatch.setattr(os, "supports_fd", set())
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        # Built and removed level by level, as mkdir(parents=True) and rmtree recurse once per level
+        levels = [tmp_path]
+        for _ in range(1200):
+            levels.append(levels[-1] / "d")
+            levels[-1].mkdir()
+        (levels[-1] / "deep.txt").write_text("deep")
+
+        try:
+            scanner = FileScanner()
+            scanner.scan_directory(tmp_path)
+
+            assert [f.path for f in scanner.scanned_files] == [levels[-1] / "deep.txt"]
+            assert scanner.errors == []
+        finally:
+            (levels[-1] / "deep.txt").unlink()
+            for level in reversed(levels[1:]):
+                level.rmdir()
+
+
+def test_scanner_walk_opens_directories_by_path_beyond_descriptor_limit(monkeypatch):
+    """Test that subdirectories past the open descriptor limit are still scanned, opened by path."""
+    monkeypatch.setattr(scanner_module, "_MAX_OPEN_DIRECTORIES", 2)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        for name in "abcde":
+            (tmp_path / name / "sub").mkdir(parents=True)
+            (tmp_path / name / "sub" / f"{name}.txt").write_text(name)
+
+        scanner = FileScanner()
+        scanner.scan_directory(tmp_path)
+
+        assert sorted(f.path.name for f in scanner.scanned_files) == [f"{name}.txt" for name in "abcde"]
+        assert scanner.errors == []
+
+
+def test_scanner_records_one_hard_link_per_file():
+    """Test that further hard links to a recorded file are neither recorded nor reported as duplicates."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        (tmp_path / "a").mkdir()
+        (tmp_path / "a" / "original.txt").write_text("shared")
+        os.link(tmp_path / "a" / "original.txt", tmp_path / "link.txt")
+        (tmp_path / "copy.txt").write_text("shared")
+
+        scanner = FileScanner()
+        scanner.scan_directory(tmp_path)
+
+        assert len(scanner.scanned_files) == 2
+        duplicates = scanner.get_duplicates()
+        assert len(duplicates) == 1
+        assert "copy.txt" in {f.path.name for group in duplicates.values() for f in group}